@@ -0,0 +1,123 @@
+#
+#	Language Theory GENerator
+#	Copyright (C) 2021  Hugues Cassé <hug.casse@gmail.com>
+#
+#	This program is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	This program is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+"""Bounded ambiguity detection. The numbers of derivations of the words
+of each non-terminal are computed by increasing length with dynamic
+programming: the counts of a non-terminal for a length are built from
+the memoized counts of the shorter spans of the symbols of its rules.
+The counts are bounded by 2 (several derivations), which also makes the
+derivation cycles converge. Only the ambiguous words of the axiom are
+parsed by the Earley parser, whose shared forest gives their number of
+parse trees and the ambiguous parts."""
+
+from common import *
+from lang import *
+import earley
+
+
+# Counter class
+class Counter:
+	"""Numbers of derivations, bounded by 2, of the words of the
+	non-terminals of G: counts[X][n] maps the words of length n derived
+	from X to their number of derivations. The lengths are computed in
+	increasing order by extend()."""
+
+	def __init__(self, G):
+		self.G = G
+		self.counts = { X: [] for X in G.names }
+		self.rules = { X: [] for X in G.names }
+		for rule in G.get_rules():
+			self.rules[rule.X].append(rule)
+
+	def extend(self):
+		"""Compute the counts for the next length. As symbols may derive
+		the empty word, the counts of a length depend on each other:
+		they are computed as a fixpoint."""
+		n = len(self.counts[self.G.top])
+		for X in self.G.names:
+			self.counts[X].append({})
+		changed = True
+		while changed:
+			changed = False
+			for X in self.G.names:
+				C = {}
+				for rule in self.rules[X]:
+					for (w, c) in self.sequences(rule.w, n):
+						C[w] = min(2, C.get(w, 0) + c)
+				if C != self.counts[X][n]:
+					self.counts[X][n] = C
+					changed = True
+
+	def sequences(self, s, n):
+		"""Get the list of (word, count) derived from the symbols s in
+		words of length n (a word may appear several times)."""
+		if len(s) == 0:
+			return [((), 1)] if n == 0 else []
+		a = s[0]
+		if a not in self.counts:
+			if n == 0:
+				return []
+			return [((a,) + w, c) for (w, c) in self.sequences(s[1:], n - 1)]
+		r = []
+		for m in range(0, n + 1):
+			C = self.counts[a][m]
+			if C == {}:
+				continue
+			vs = self.sequences(s[1:], n - m)
+			r += [(u + v, min(2, c * d)) for (u, c) in C.items() for (v, d) in vs]
+		return r
+
+	def ambiguous(self, X, n):
+		"""Get the sorted list of words of length n having several
+		derivations from X."""
+		return sorted(w for (w, c) in self.counts[X][n].items() if c > 1)
+
+
+def ambiguities(G, length):
+	"""Generate the ambiguous words of L(G) up to the given length by
+	increasing length as (word, forest)."""
+	C = Counter(G)
+	P = None
+	for n in range(0, length + 1):
+		C.extend()
+		for w in C.ambiguous(G.top, n):
+			if P == None:
+				P = earley.Earley(G)
+			yield (Word(*w), P.parse(Word(*w)))
+
+
+def shortest(G, length):
+	"""Get the list of the shortest ambiguous words of L(G), up to the
+	given length, as (word, forest)."""
+	r = []
+	for (w, F) in ambiguities(G, length):
+		if r != [] and len(w) > len(r[0][0]):
+			break
+		r.append((w, F))
+	return r
+
+
+def ambiguity_to_str(w, F):
+	"""Build the lines describing the ambiguous word w of forest F."""
+	c = F.count()
+	ls = ["%s: %s" % (w, "infinitely many trees" if c == None else "%d trees" % c)]
+	for (X, i, j, ns) in F.ambiguities():
+		ls.append("\t%s -> %s using %s" % (X, w[i:j],
+			", ".join("(%d)" % n for n in ns)))
+	return ls
@@ -0,0 +1,173 @@
+#
+#	Language Theory GENerator
+#	Copyright (C) 2021  Hugues Cassé <hug.casse@gmail.com>
+#
+#	This program is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	This program is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+"""Batch LL(k) parser validating many words at once. The table and the
+words are stored as NumPy integer arrays and the parsers of the words
+move in lockstep: each step performs the table lookups, the pops and
+the pushes of all the running parsers with vectorized operations.
+
+The symbols are encoded as integers: 0 is the padding, the tokens are
+numbered from 1 (the last number standing for the tokens unknown to the
+table) and the non-terminals come after. A lookahead is encoded in base
+B, the number of tokens plus 2, with its first token as least
+significant digit and the non-terminal of the row above the k digits of
+the lookahead. The keys of the table entries are sorted to be looked up
+with a binary search."""
+
+import numpy as np
+
+from common import *
+from lang import *
+from ll import ACCEPT, ERROR
+
+# state of a parser that is not ended
+RUNNING = 0
+
+# initial size of the stacks
+STACK_SIZE = 16
+
+
+# BatchParser class
+class BatchParser:
+	"""Batch parser using an LL(k) table as built by ll.Table."""
+
+	def __init__(self, table):
+		self.table = table
+		self.G = table.G
+		self.k = table.k
+
+		# encode the symbols
+		nts = table.get_non_terminals()
+		tokens = set(self.G.tokens) | { "$" }
+		for la in table.get_lookaheads():
+			tokens |= set(la)
+		self.codes = { a: i + 1 for (i, a) in enumerate(sorted(tokens)) }
+		self.unknown = len(tokens) + 1
+		self.base = len(tokens) + 2
+		for (i, X) in enumerate(nts):
+			self.codes[X] = self.base + i
+		self.row = self.base ** self.k
+		if len(nts) * self.row >= 1 << 63:
+			raise ValueError("too many lookaheads for batch parsing")
+		self.powers = np.array([self.base ** j for j in range(0, self.k)], dtype = np.int64)
+		self.depths = np.array([table.depth(X) for X in nts], dtype = np.int64)
+
+		# encode the entries (with a sentinel at the end)
+		las = table.get_lookaheads()
+		entries = sorted((i * self.row + self.encode_lookahead(las[j]), n)
+			for (i, j, n) in table.entries())
+		self.keys = np.array([e[0] for e in entries] + [np.iinfo(np.int64).max],
+			dtype = np.int64)
+		self.rules = np.array([e[1] for e in entries] + [ERROR], dtype = np.int64)
+
+		# encode the reversed right parts of the rules
+		rules = self.G.get_rules()
+		self.lengths = np.array([len(rule.w) for rule in rules], dtype = np.int64)
+		self.rhs = np.zeros((len(rules), max(1, int(self.lengths.max()))), dtype = np.int32)
+		for (n, rule) in enumerate(rules):
+			for (j, a) in enumerate(reversed(tuple(rule.w))):
+				self.rhs[n, j] = self.codes.get(a, self.unknown)
+
+	def encode_lookahead(self, la):
+		"""Encode the lookahead word la as an integer."""
+		return sum(self.codes[a] * self.base ** j for (j, a) in enumerate(la))
+
+	def encode(self, words):
+		"""Encode the words as a matrix of symbol codes: each row is made
+		of the tokens of a word followed by k end markers and padded with
+		zeros (at least k). Return the matrix and the word lengths."""
+		lengths = np.array([len(w) for w in words], dtype = np.int64)
+		width = int(lengths.max(initial = 0)) + 2 * self.k
+		W = np.zeros((len(words), width), dtype = np.int32)
+		codes = np.array([self.codes.get(a, self.unknown) for w in words for a in w],
+			dtype = np.int32)
+		W[np.arange(width) < lengths[:, None]] = codes
+		rows = np.arange(len(words))
+		for j in range(0, self.k):
+			W[rows, lengths + j] = self.codes["$"]
+		return (W, lengths)
+
+	def parse(self, words):
+		"""Parse the given words (lists of tokens) and return, for each
+		word, the pair (ACCEPT or ERROR, number of consumed tokens) as
+		ll.Parser would end: in case of error, the consumed tokens
+		are the ones before the erroneous token (end markers included)."""
+		k = self.k
+		n = len(words)
+		(W, lengths) = self.encode(words)
+		pos = np.zeros(n, dtype = np.int64)
+		stack = np.zeros((n, max(STACK_SIZE, k + 1)), dtype = np.int32)
+		stack[:, :k] = self.codes["$"]
+		stack[:, k] = self.codes[self.G.get_top()]
+		sp = np.full(n, k + 1, dtype = np.int64)
+		status = np.full(n, RUNNING, dtype = np.int64)
+		cols = np.arange(k)
+
+		act = np.arange(n)
+		while act.size != 0:
+			s = sp[act]
+			cur = W[act, pos[act]]
+
+			# empty stacks: accepted if the whole word is consumed
+			empty = s == 0
+			e = act[empty]
+			status[e] = np.where(W[e, pos[e]] == 0, ACCEPT, ERROR)
+
+			# pop the matching tokens
+			top = stack[act, np.maximum(s - 1, 0)]
+			pop = ~empty & (top == cur)
+			p = act[pop]
+			sp[p] -= 1
+			pos[p] += 1
+
+			# look up the rules of the non-terminals
+			exp = ~empty & ~pop
+			x = act[exp]
+			X = top[exp].astype(np.int64) - self.base
+			nt = X >= 0
+			status[x[~nt]] = ERROR
+			x = x[nt]
+			X = X[nt]
+			la = W[x[:, None], pos[x, None] + cols].astype(np.int64)
+			la[la >= self.base] = self.unknown
+			la[cols >= self.depths[X][:, None]] = 0
+			key = X * self.row + la @ self.powers
+			i = np.searchsorted(self.keys, key)
+			found = self.keys[i] == key
+			r = self.rules[i]
+			status[x[~found]] = ERROR
+			x = x[found]
+			r = r[found]
+
+			# replace the non-terminals by the reversed right parts
+			s = sp[x] - 1
+			L = self.lengths[r]
+			size = int((s + L).max(initial = 0))
+			if size > stack.shape[1]:
+				grown = np.zeros((n, max(size, 2 * stack.shape[1])), dtype = np.int32)
+				grown[:, :stack.shape[1]] = stack
+				stack = grown
+			for j in range(0, int(L.max(initial = 0))):
+				m = L > j
+				stack[x[m], s[m] + j] = self.rhs[r[m], j]
+			sp[x] = s + L
+
+			act = act[status[act] == RUNNING]
+
+		return list(zip(status.tolist(), pos.tolist()))
@@ -18,7 +18,9 @@
 
 """Comon resources (like user-interactions)."""
 
+import hashlib
 import sys
+from collections import OrderedDict
 
 STDOUT = sys.stdout
 STDERR = sys.stderr
@@ -43,3 +45,48 @@ def output(msg):
 	"""Display a result to the user."""
 	STDOUT.write("%s\n" % msg)
 
+
+
+# caching
+def digest(*parts):
+	"""Compute a key identifying the given parts (usually a grammar text
+	and analysis parameters)."""
+	h = hashlib.sha256()
+	for p in parts:
+		h.update(str(p).encode("utf-8"))
+		h.update(b"\0")
+	return h.hexdigest()
+
+
+class LRUCache:
+	"""Cache keeping only the size last used entries."""
+
+	def __init__(self, size = 64):
+		self.size = size
+		self.map = OrderedDict()
+
+	def get(self, key, default = None):
+		"""Get the value for key (and mark it as used) or default."""
+		try:
+			self.map.move_to_end(key)
+			return self.map[key]
+		except KeyError:
+			return default
+
+	def put(self, key, value):
+		"""Record a value in the cache, possibly removing the least
+		recently used entry."""
+		self.map[key] = value
+		self.map.move_to_end(key)
+		while len(self.map) > self.size:
+			self.map.popitem(last = False)
+
+	def remove(self, key):
+		"""Remove the entry for key if any."""
+		self.map.pop(key, None)
+
+	def __contains__(self, key):
+		return key in self.map
+
+	def __len__(self):
+		return len(self.map)
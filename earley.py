@@ -0,0 +1,452 @@
+#
+#	Language Theory GENerator
+#	Copyright (C) 2021  Hugues Cassé <hug.casse@gmail.com>
+#
+#	This program is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	This program is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+"""General context-free parser (Earley) building shared packed parse
+forests (SPPF) as described by E. Scott, "SPPF-Style Parsing From Earley
+Recognisers" (2008). The forest is binarised so that its size stays
+polynomial even for highly ambiguous words.
+
+Predictions and completions are filtered with the 1-lookaheads of the
+rules and the 1-follows of the non-terminals: this does not change the
+parsed language but keeps the Earley sets small (and the parsing time
+close to linear) when the grammar is nearly deterministic."""
+
+import gc
+import heapq
+
+from common import *
+from lang import *
+
+# end of word marker
+END = "$"
+
+
+# Node class
+class Node:
+	"""Node of a shared packed parse forest covering the tokens from
+	start to end. label is a symbol (for symbol and token nodes) or an
+	item (rule, dot) for the intermediate nodes of the binarised forest.
+	families is the list of packed nodes, each one represented as
+	(rule, children) with children made of 0, 1 or 2 nodes."""
+
+	def __init__(self, label, start, end):
+		self.label = label
+		self.start = start
+		self.end = end
+		self.families = []
+		self.keys = set()
+
+	def is_item(self):
+		return type(self.label) == tuple
+
+	def is_token(self):
+		return not self.is_item() and self.families == []
+
+	def add_family(self, rule, children):
+		key = (rule, children)
+		if key not in self.keys:
+			self.keys.add(key)
+			self.families.append(key)
+
+	def __str__(self):
+		if self.is_item():
+			return "(%d.%d, %d, %d)" % (self.label[0], self.label[1],
+				self.start, self.end)
+		else:
+			return "(%s, %d, %d)" % (self.label, self.start, self.end)
+
+	def __repr__(self):
+		return str(self)
+
+
+# Forest class
+class Forest:
+	"""Result of a general parse: root is the SPPF node of the axiom
+	(None if the word is rejected) and error is the position of the
+	first erroneous token in case of failure."""
+
+	def __init__(self, G, root, error = None):
+		self.G = G
+		self.root = root
+		self.error = error
+
+	def is_accepted(self):
+		return self.root != None
+
+	def nodes(self):
+		"""Get the list of nodes reachable from the root."""
+		if self.root == None:
+			return []
+		seen = { self.root }
+		todo = [self.root]
+		while todo != []:
+			node = todo.pop()
+			for (rule, children) in node.families:
+				for child in children:
+					if child not in seen:
+						seen.add(child)
+						todo.append(child)
+		return list(seen)
+
+	def count(self):
+		"""Count the parse trees of the word: 0 if the word is rejected,
+		None if there are infinitely many trees (cyclic grammar)."""
+		if self.root == None:
+			return 0
+		counts = {}
+		active = set()
+		todo = [(self.root, False)]
+		while todo != []:
+			(node, done) = todo.pop()
+			if done:
+				active.remove(node)
+				n = 0
+				for (rule, children) in node.families:
+					m = 1
+					for child in children:
+						m = m * counts[child]
+					n = n + m
+				if node.families == []:
+					n = 1
+				counts[node] = n
+			elif node not in counts:
+				if node in active:
+					return None
+				active.add(node)
+				todo.append((node, True))
+				for (rule, children) in node.families:
+					for child in children:
+						if child not in counts:
+							todo.append((child, False))
+		return counts[self.root]
+
+	def is_ambiguous(self):
+		"""Test if the word has several parse trees."""
+		return any(len(node.families) > 1 for node in self.nodes())
+
+	def ambiguities(self):
+		"""Get the ambiguous parts of the forest as a sorted list of
+		(non-terminal, start, end, rules): the non-terminal derives the
+		tokens from start to end in several ways, using the given rules
+		(a rule appears alone if its right part can be split in several
+		ways)."""
+		rules = self.G.get_rules()
+		r = {}
+		for node in self.nodes():
+			if len(node.families) > 1:
+				if node.is_item():
+					X = rules[node.label[0]].X
+				else:
+					X = node.label
+				r.setdefault((X, node.start, node.end), set()) \
+					.update(n for (n, children) in node.families)
+		return sorted((X, i, j, sorted(ns)) for ((X, i, j), ns) in r.items())
+
+	def trees(self):
+		"""Generate the parse trees (as lang.ParseTree) of the word.
+		Trees using a cycle of the forest are not generated."""
+		if self.root != None:
+			yield from self.trees_of(self.root, set())
+
+	def tree(self):
+		"""Get a parse tree of the word (or None), built without
+		recursion. Each node uses the first of its families giving
+		the lowest tree: the heights are computed from the leaves
+		in increasing order so that the cycles are avoided."""
+		if self.root == None:
+			return None
+		choice = self.choose()
+		root = ParseTree(self.root.label)
+		todo = [(self.root, root)]
+		while todo != []:
+			(node, t) = todo.pop()
+			if node.families == []:
+				continue
+			(rule, children) = node.families[choice[node]]
+			t.rule = rule
+			nodes = []
+			while len(children) == 2 and children[0].is_item():
+				nodes.append(children[1])
+				children = children[0].families[choice[children[0]]][1]
+			nodes += reversed(children)
+			nodes.reverse()
+			t.children = [ParseTree(n.label) for n in nodes]
+			todo += zip(nodes, t.children)
+		return root
+
+	def choose(self):
+		"""Choose the family of each node used by tree(): the family
+		minimizing the height of the tree, the first one in case of
+		tie. Return the map of the nodes to their family index."""
+		parents = {}
+		waiting = {}
+		heap = []
+		for node in self.nodes():
+			if node.families == []:
+				heapq.heappush(heap, (0, 0, id(node), node))
+			for (i, (rule, children)) in enumerate(node.families):
+				waiting[(node, i)] = len(children)
+				if children == ():
+					heapq.heappush(heap, (1, i, id(node), node))
+				for child in children:
+					parents.setdefault(child, []).append((node, i))
+		heights = {}
+		choice = {}
+		while heap != []:
+			(h, i, _, node) = heapq.heappop(heap)
+			if node in heights:
+				continue
+			heights[node] = h
+			choice[node] = i
+			for (parent, j) in parents.get(node, []):
+				waiting[(parent, j)] -= 1
+				if waiting[(parent, j)] == 0 and parent not in heights:
+					heapq.heappush(heap, (h + 1, j, id(parent), parent))
+		return choice
+
+	def trees_of(self, node, path):
+		if node.is_token():
+			yield ParseTree(node.label)
+			return
+		path = path | { node }
+		for (rule, children) in node.families:
+			for cs in self.sequences(children, path):
+				t = ParseTree(node.label)
+				t.rule = rule
+				t.children = cs
+				yield t
+
+	def sequences(self, children, path):
+		"""Generate the lists of trees of the right part of a rule
+		represented by the children of a family."""
+		if children == ():
+			yield []
+		elif len(children) == 1:
+			for t in self.sub_trees(children[0], path):
+				yield [t]
+		else:
+			for l in self.prefixes(children[0], path):
+				for t in self.sub_trees(children[1], path):
+					yield l + [t]
+
+	def prefixes(self, node, path):
+		if node.is_item():
+			for (rule, children) in node.families:
+				yield from self.sequences(children, path)
+		else:
+			for t in self.sub_trees(node, path):
+				yield [t]
+
+	def sub_trees(self, node, path):
+		if node not in path:
+			yield from self.trees_of(node, path)
+
+	def write_dot(self, out):
+		"""Write the forest in .dot format: packed nodes are displayed
+		as points."""
+		out.write("digraph G {\n")
+		ids = {}
+		for node in self.nodes():
+			ids[node] = len(ids)
+		for (node, i) in ids.items():
+			if node.is_item():
+				rule = self.G.get_rules()[node.label[0]]
+				d = node.label[1]
+				label = "%s -> %s, %d, %d" % (rule.X,
+					" ".join(list(rule.w[:d]) + ["."] + list(rule.w[d:])),
+					node.start, node.end)
+				shape = "box"
+			else:
+				label = "%s, %d, %d" % (node.label, node.start, node.end)
+				shape = "ellipse"
+			out.write("\t%d [label=\"%s\", shape=%s];\n"
+				% (i, label.replace("\"", "\\\""), shape))
+			for (j, (rule, children)) in enumerate(node.families):
+				out.write("\tp%d_%d [shape=point];\n" % (i, j))
+				out.write("\t%d -> p%d_%d;\n" % (i, i, j))
+				for child in children:
+					out.write("\tp%d_%d -> %d;\n" % (i, j, ids[child]))
+		out.write("}\n")
+
+
+# Earley class
+class Earley:
+	"""Earley parser for any grammar G. An item (rule, dot) is
+	represented by the integer offset of the rule plus the dot."""
+
+	def __init__(self, G):
+		self.G = G
+		rules = G.get_rules()
+		self.nts = set(G.names)
+
+		# items
+		self.offsets = []
+		self.item_rule = []
+		self.item_next = []
+		for (n, rule) in enumerate(rules):
+			self.offsets.append(len(self.item_rule))
+			for i in range(0, len(rule.w) + 1):
+				self.item_rule.append(n)
+				self.item_next.append(rule.w[i] if i < len(rule.w) else None)
+
+		# lookaheads and follows
+		ff = FirstFollow(G)
+		ff.next()
+		self.las = [{ w[0] for w in ff.lookahead(rule.X, rule.w) if len(w) != 0 }
+			for rule in rules]
+		self.follows = { X: { w[0] for w in ff.follow(X) if len(w) != 0 }
+			for X in G.names }
+		self.follows[G.top] = { END }
+		self.by_nt = { X: [] for X in G.names }
+		for (n, rule) in enumerate(rules):
+			self.by_nt[rule.X].append(n)
+
+	def parse(self, word):
+		"""Parse the given word and return the corresponding forest."""
+		# the forest has no reference cycle but the garbage collector
+		# makes the parsing time quadratic by scanning it again and again
+		enabled = gc.isenabled()
+		gc.disable()
+		try:
+			return self.do_parse(word)
+		finally:
+			if enabled:
+				gc.enable()
+
+	def do_parse(self, word):
+		G = self.G
+		rules = G.get_rules()
+		n = len(word)
+		a = [word[i] for i in range(0, n)] + [END]
+		item_next = self.item_next
+		item_rule = self.item_rule
+		nts = self.nts
+
+		def make_node(item, j, i, w, v, V):
+			"""Build the node of item (whose dot is after v) from
+			the node of the item before the dot (w)."""
+			r = item_rule[item]
+			dot = item - self.offsets[r]
+			if item_next[item] == None:
+				label = rules[r].X
+			else:
+				label = (r, dot)
+			if dot == 1 and item_next[item] != None:
+				return v
+			y = V.get((label, j))
+			if y == None:
+				y = Node(label, j, i)
+				V[(label, j)] = y
+			if w == None:
+				y.add_family(r, (v,))
+			else:
+				y.add_family(r, (w, v))
+			return y
+
+		# sets of items (item, origin, node) with, for each set, the
+		# items waiting for each non-terminal
+		E = [set() for i in range(0, n + 1)]
+		waiting = [{} for i in range(0, n + 1)]
+		def add(i, x, R):
+			if x not in E[i]:
+				E[i].add(x)
+				R.append(x)
+				X = item_next[x[0]]
+				if X != None:
+					waiting[i].setdefault(X, []).append(x)
+
+		Q2 = []
+		R = []
+		V = {}
+		for r in self.by_nt[G.top]:
+			x = (self.offsets[r], 0, None)
+			if item_next[x[0]] == a[0]:
+				Q2.append(x)
+			else:
+				add(0, x, R)
+
+		for i in range(0, n + 1):
+			H = {}
+			Q = Q2
+			Q2 = []
+			R = list(E[i])
+			while R != []:
+				(item, h, w) = R.pop()
+				C = item_next[item]
+
+				# prediction
+				if C in nts:
+					for r in self.by_nt[C]:
+						if a[i] not in self.las[r]:
+							continue
+						x = (self.offsets[r], i, None)
+						if item_next[x[0]] == a[i]:
+							Q.append(x)
+						elif item_next[x[0]] == None or item_next[x[0]] in nts:
+							add(i, x, R)
+					v = H.get(C)
+					if v != None:
+						y = make_node(item + 1, h, i, w, v, V)
+						self.advance(i, (item + 1, h, y), a, add, Q, R)
+
+				# completion
+				elif C == None:
+					D = rules[item_rule[item]].X
+					if a[i] not in self.follows[D]:
+						continue
+					if w == None:
+						w = V.get((D, i))
+						if w == None:
+							w = Node(D, i, i)
+							V[(D, i)] = w
+						w.add_family(item_rule[item], ())
+					if h == i:
+						H[D] = w
+					for (item2, k, z) in list(waiting[h].get(D, [])):
+						y = make_node(item2 + 1, k, i, z, w, V)
+						self.advance(i, (item2 + 1, k, y), a, add, Q, R)
+
+			# scanning
+			if i == n:
+				break
+			if Q == []:
+				return Forest(G, None, i)
+			V = {}
+			v = Node(a[i], i, i + 1)
+			for (item, h, w) in dict.fromkeys(Q):
+				y = make_node(item + 1, h, i + 1, w, v, V)
+				x = (item + 1, h, y)
+				B = item_next[x[0]]
+				if B == None or B in nts:
+					add(i + 1, x, [])
+				if B == a[i + 1]:
+					Q2.append(x)
+
+		# look for the root
+		for (item, h, w) in E[n]:
+			if item_rule[item] == 0 and item_next[item] == None and h == 0:
+				return Forest(G, w)
+		return Forest(G, None, n)
+
+	def advance(self, i, x, a, add, Q, R):
+		"""Record item x obtained by moving a dot in set i."""
+		B = self.item_next[x[0]]
+		if B == None or B in self.nts:
+			add(i, x, R)
+		elif B == a[i]:
+			Q.append(x)
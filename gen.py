@@ -0,0 +1,447 @@
+#
+#	Language Theory GENerator
+#	Copyright (C) 2021  Hugues Cassé <hug.casse@gmail.com>
+#
+#	This program is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	This program is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+"""Generation of the words of the language of a grammar."""
+
+import heapq
+import itertools
+import random
+
+from common import *
+from lang import *
+
+# maximal number of words memoized for a non-terminal and a length
+MEMO_WORDS = 1024
+
+
+def unique(ws):
+	"""Remove the duplicates of a sorted sequence."""
+	last = None
+	for w in ws:
+		if w != last:
+			yield w
+			last = w
+
+
+def max_length(G):
+	"""Get the length of the longest word of L(G) or None if L(G) is
+	infinite (or -1 if it is empty)."""
+	rules = G.get_rules()
+	L = { X: None for X in G.names }
+	def length(w):
+		r = 0
+		for a in w:
+			if a not in L:
+				r = r + 1
+			elif L[a] == None:
+				return None
+			else:
+				r = r + L[a]
+		return r
+	for i in range(0, len(G.names) + 2):
+		changed = False
+		for rule in rules:
+			l = length(rule.w)
+			if l != None and (L[rule.X] == None or l > L[rule.X]):
+				L[rule.X] = l
+				changed = True
+		if not changed:
+			return -1 if L[G.top] == None else L[G.top]
+	return None
+
+
+# Enumerator class
+class Enumerator:
+	"""Enumerates the words of L(G) by increasing length (and in
+	lexicographic order for a given length) without duplicates.
+
+	The generation is guided by the table telling, for each non-terminal
+	and length, if the non-terminal derives words of this length. The
+	words of a non-terminal for a given length are generated lazily and
+	kept only if they are less than MEMO_WORDS. Words are represented by
+	tuples of tokens."""
+
+	def __init__(self, G):
+		self.G = G
+		self.rules = { X: [] for X in G.names }
+		for rule in G.get_rules():
+			self.rules[rule.X].append(tuple(rule.w))
+		self.table = { X: [] for X in G.names }
+		self.memo = {}
+
+	def extend(self, n):
+		"""Compute the table up to length n."""
+		while len(self.table[self.G.top]) <= n:
+			l = len(self.table[self.G.top])
+			cur = { X: False for X in self.G.names }
+			changed = True
+			while changed:
+				changed = False
+				for (X, ws) in self.rules.items():
+					if not cur[X] and any(self.able(w, l, cur) for w in ws):
+						cur[X] = True
+						changed = True
+			for X in self.G.names:
+				self.table[X].append(cur[X])
+
+	def able(self, w, n, cur = None):
+		"""Test if the sequence of symbols w derives words of length n.
+		cur gives the current state of the table for length n while it is
+		computed."""
+		lengths = { 0 }
+		for a in w:
+			if a not in self.table:
+				lengths = { l + 1 for l in lengths if l < n }
+			else:
+				T = self.table[a]
+				lengths = { l + m for l in lengths for m in range(0, n - l + 1)
+					if (cur[a] if m == n and cur != None else T[m]) }
+			if lengths == set():
+				return False
+		return n in lengths
+
+	def has_words(self, a, n):
+		"""Test if the symbol a derives words of length n."""
+		if a not in self.table:
+			return n == 1
+		self.extend(n)
+		return self.table[a][n]
+
+	def words(self, X, n, path = frozenset()):
+		"""Generate the sorted words of length n derived from X. path is
+		the set of non-terminals being derived with the same length:
+		they are not derived again (this would only produce the same
+		words with a longer derivation)."""
+		if not self.has_words(X, n):
+			return
+		fresh = path == frozenset()
+		if fresh:
+			memo = self.memo.get((X, n))
+			if memo != None:
+				yield from memo
+				return
+		path = path | { X }
+		ws = unique(heapq.merge(*[self.sequence(w, 0, n, path) for w in self.rules[X]]))
+		if not fresh or (X, n) in self.memo:
+			yield from ws
+		else:
+			l = list(itertools.islice(ws, MEMO_WORDS + 1))
+			if len(l) <= MEMO_WORDS:
+				self.memo[(X, n)] = l
+				yield from l
+			else:
+				self.memo[(X, n)] = None
+				yield from l
+				yield from ws
+
+	def sequence(self, w, i, n, path):
+		"""Generate the sorted words of length n derived from w[i:]."""
+		if i == len(w):
+			if n == 0:
+				yield ()
+			return
+		streams = []
+		for m in range(0, n + 1):
+			if self.has_words(w[i], m) and self.able(w[i + 1:], n - m):
+				streams.append(self.concat(w, i, m, n, path))
+		yield from heapq.merge(*streams)
+
+	def concat(self, w, i, m, n, path):
+		"""Generate the words of w[i:] of length n whose prefix of
+		length m comes from w[i]."""
+		if w[i] not in self.table:
+			us = [(w[i],)]
+		elif w[i] in path and m == n:
+			return
+		else:
+			us = self.words(w[i], m, path if m == n else frozenset())
+		for u in us:
+			for v in self.sequence(w, i + 1, n - m, path if m == 0 else frozenset()):
+				yield u + v
+
+	def language(self, length = None, count = None):
+		"""Generate the words of L(G) as Word, by increasing length, up
+		to the given length and the given count of words."""
+		top = max_length(self.G)
+		if length == None or (top != None and top < length):
+			length = top
+		n = 0
+		while (length == None or n <= length) and (count == None or count > 0):
+			for w in self.words(self.G.top, n):
+				if count != None:
+					if count == 0:
+						return
+					count = count - 1
+				yield Word(*w)
+			n = n + 1
+
+
+def language(G, length = None, count = None):
+	"""Generate the words of L(G) by increasing length up to the given
+	length and the given count of words."""
+	return Enumerator(G).language(length, count)
+
+
+def min_lengths(G):
+	"""Get the length of the shortest word derived by each non-terminal
+	(None for the non-terminals deriving no word)."""
+	L = { X: None for X in G.names }
+	def length(w):
+		r = 0
+		for a in w:
+			if a not in L:
+				r = r + 1
+			elif L[a] == None:
+				return None
+			else:
+				r = r + L[a]
+		return r
+	changed = True
+	while changed:
+		changed = False
+		for rule in G.get_rules():
+			l = length(rule.w)
+			if l != None and (L[rule.X] == None or l < L[rule.X]):
+				L[rule.X] = l
+				changed = True
+	return L
+
+
+def parse_lengths(text):
+	"""Parse a length distribution made of comma-separated items L or
+	MIN..MAX, optionally followed by :WEIGHT (default to 1), and return
+	it as a dictionary of weights."""
+	lengths = {}
+	for item in text.split(","):
+		if ":" in item:
+			(item, weight) = item.split(":")
+			weight = float(weight)
+		else:
+			weight = 1
+		if ".." in item:
+			(l, h) = [int(x) for x in item.split("..")]
+		else:
+			l = h = int(item)
+		for n in range(l, h + 1):
+			lengths[n] = weight
+	return lengths
+
+
+# Generator class
+class Generator:
+	"""Random generator of the words of L(G). For each length n, counts[n]
+	gives the rounds of the numbers of derivations of words of length n:
+	in round r, chains of derivations keeping the length n are at most r
+	long. The rounds stop as soon as the numbers do not change anymore
+	(no cycle of unit or empty rules) or after |N| + 1 rounds. Once the
+	length of a word is selected, all its counted derivations have the same
+	probability to be drawn."""
+
+	def __init__(self, G, seed = None):
+		self.G = G
+		self.rules = G.get_rules()
+		self.by_nt = { X: [] for X in G.names }
+		for (i, rule) in enumerate(self.rules):
+			self.by_nt[rule.X].append(i)
+		self.random = random.Random(seed)
+		self.max_rounds = len(G.names) + 1
+		self.counts = []
+		self.parts = []
+		self.suffixes = []
+		self.mins = None
+
+	def count(self, X, n, r = None):
+		"""Get the number of derivations of words of length n from symbol
+		X (in round r, the last round by default)."""
+		if X not in self.by_nt:
+			return 1 if n == 1 else 0
+		self.extend(n)
+		rounds = self.counts[n]
+		if r == None or r >= len(rounds):
+			return rounds[-1][X]
+		return rounds[r][X]
+
+	def suffix(self, i, n, r):
+		"""Get the numbers of derivations of length n of the suffixes of
+		the right part of rule i in round r."""
+		w = self.rules[i].w
+		F = [0] * len(w) + [1 if n == 0 else 0]
+		for j in range(len(w) - 1, -1, -1):
+			a = w[j]
+			if a not in self.by_nt:
+				if n > 0:
+					F[j] = self.suffixes[n - 1][i][j + 1]
+			elif n == 0:
+				F[j] = self.count(a, 0, r - 1) * F[j + 1]
+			else:
+				F[j] = self.parts[n][i][j] \
+					+ self.count(a, 0) * F[j + 1] \
+					+ self.count(a, n, r - 1) * self.suffixes[0][i][j + 1]
+		return F
+
+	def extend(self, n):
+		"""Compute the numbers of derivations up to length n."""
+		while len(self.counts) <= n:
+			l = len(self.counts)
+
+			# part of the suffixes not depending on the round
+			parts = []
+			S = self.suffixes
+			for (i, rule) in enumerate(self.rules):
+				P = [0] * (len(rule.w) + 1)
+				for (j, a) in enumerate(rule.w):
+					if a in self.by_nt:
+						P[j] = sum(self.counts[m][-1][a] * S[l - m][i][j + 1]
+							for m in range(1, l))
+				parts.append(P)
+			self.parts.append(parts)
+
+			# compute the rounds
+			rounds = [{ X: 0 for X in self.G.names }]
+			self.counts.append(rounds)
+			while len(rounds) <= self.max_rounds:
+				r = len(rounds)
+				cur = { X: sum(self.suffix(i, l, r)[0] for i in self.by_nt[X])
+					for X in self.G.names }
+				if cur == rounds[-1]:
+					break
+				rounds.append(cur)
+			self.suffixes.append([self.suffix(i, l, len(rounds))
+				for i in range(0, len(self.rules))])
+
+	def choose(self, total, weights):
+		"""Choose an item according to the generated pairs (item, weight)
+		whose weights sum to total."""
+		x = self.random.randrange(total)
+		for (item, weight) in weights:
+			if x < weight:
+				return item
+			x = x - weight
+
+	def derive(self, X, n, used = None):
+		"""Generate the tokens of a random word of length n derived from
+		X (that must exist). The indexes of the used rules are added to
+		the set used."""
+		self.extend(n)
+		todo = [(X, n, self.max_rounds)]
+		while todo != []:
+			(a, n, r) = todo.pop()
+			if a not in self.by_nt:
+				yield a
+				continue
+			r = min(r, len(self.counts[n]) - 1)
+			weights = [(i, self.suffix(i, n, r)) for i in self.by_nt[a]]
+			(i, F) = self.choose(sum(F[0] for (i, F) in weights),
+				[((i, F), F[0]) for (i, F) in weights])
+			if used != None:
+				used.add(i)
+			todo.extend(reversed(self.split(i, n, r, F)))
+
+	def split(self, i, n, r, F):
+		"""Split randomly the length n between the symbols of rule i
+		in round r and return the list of (symbol, length, round)."""
+		w = self.rules[i].w
+		S = self.suffixes
+		result = []
+		l = n
+		for j in range(0, len(w)):
+			a = w[j]
+			if a not in self.by_nt:
+				result.append((a, 1, self.max_rounds))
+				l = l - 1
+				continue
+			m = self.choose(F[j] if l == n else S[l][i][j],
+				((m, self.count(a, m, r - 1 if m == n else None)
+					* (F[j + 1] if l - m == n else S[l - m][i][j + 1]))
+				for m in range(0, l + 1)))
+			result.append((a, m, r - 1 if m == n else self.max_rounds))
+			l = l - m
+		return result
+
+	def length(self, X, lengths):
+		"""Draw a length of the words of X from the dictionary of weights
+		lengths (or the shortest length if X has no word of these lengths)."""
+		ls = [n for n in lengths if self.count(X, n) > 0]
+		if ls == []:
+			if self.mins == None:
+				self.mins = min_lengths(self.G)
+			return self.mins[X]
+		return self.random.choices(ls, [lengths[n] for n in ls])[0]
+
+	def words(self, lengths, count = None, used = None):
+		"""Generate count (endlessly if None) random words whose length
+		is drawn from lengths, a dictionary of weights or a sequence
+		of equally weighted lengths."""
+		if not isinstance(lengths, dict):
+			lengths = { n: 1 for n in lengths }
+		if not any(self.count(self.G.top, n) > 0 for n in lengths):
+			return
+		while count == None or count > 0:
+			n = self.length(self.G.top, lengths)
+			yield Word(*self.derive(self.G.top, n, used))
+			if count != None:
+				count = count - 1
+
+	def cover(self, lengths, used = None):
+		"""Generate random words until all the rules of the grammar used
+		in the derivations of L(G) are used. used is the set of the indexes
+		of the already used rules (updated on generation)."""
+		if not isinstance(lengths, dict):
+			lengths = { n: 1 for n in lengths }
+		if used == None:
+			used = set()
+		if self.mins == None:
+			self.mins = min_lengths(self.G)
+
+		# find how to reach each non-terminal with the productive rules
+		parent = { self.G.top: None }
+		todo = [self.G.top]
+		while todo != []:
+			X = todo.pop(0)
+			for i in self.by_nt[X]:
+				w = self.rules[i].w
+				if all(self.mins.get(a, 1) != None for a in w):
+					for (j, a) in enumerate(w):
+						if a in self.by_nt and a not in parent:
+							parent[a] = (i, j)
+							todo.append(a)
+
+		# generate a word for each not used rule
+		for (i, rule) in enumerate(self.rules):
+			if i in used or rule.X not in parent \
+			or any(self.mins.get(a, 1) == None for a in rule.w):
+				continue
+			chain = [(i, None)]
+			X = rule.X
+			while parent[X] != None:
+				chain.append(parent[X])
+				X = self.rules[parent[X][0]].X
+			form = [X]
+			k = 0
+			for (j, pos) in reversed(chain):
+				used.add(j)
+				form[k:k + 1] = self.rules[j].w
+				if pos != None:
+					k = k + pos
+			tokens = []
+			for a in form:
+				if a not in self.by_nt:
+					tokens.append(a)
+				else:
+					tokens += self.derive(a, self.length(a, lengths), used)
+			yield Word(*tokens)
@@ -18,6 +18,11 @@
 
 """Facilities to manage languages, words, word set, etc."""
 
+import re
+import resource
+import sys
+import time
+
 from common import *
 
 # formatting functions
@@ -167,6 +172,7 @@ class Grammar:
 	as a token (terminal)."""
 
 	def __init__(self, rules = None, text = None):
+		self.lexer = []
 		if text != None:
 			self.parse_text(rules, text)
 		elif type(rules) == str:
@@ -187,6 +193,9 @@ class Grammar:
 		self.tokens = list(self.tokens - self.names)
 		self.names = [self.top] + list(self.names)
 
+		# follow_k(X) sets already computed by follow() by (k, X)
+		self.follows = {}
+
 	def get_top(self):
 		return self.top
 
@@ -208,12 +217,16 @@ class Grammar:
 	def parse(self, path, lines):
 		n = 0
 		self.rules = []
+		self.lexer = []
 		for l in lines:
 			n = n + 1
 			if l == "":
 				continue
 			if l[-1] == "\n":
 				l = l[:-1]
+			if l.lstrip().startswith("%"):
+				self.parse_lexer(path, n, l.strip())
+				continue
 			if "#" in l:
 				l = l[:l.index("#")]
 			l = l.strip()
@@ -237,6 +250,26 @@ class Grammar:
 		if self.rules == []:
 			fatal("empty grammar in %s" % path)
 
+	def parse_lexer(self, path, n, l):
+		"""Parse a lexer line (%token NAME REGEX or %skip REGEX) and
+		record it in lexer as (NAME, REGEX) or (None, REGEX)."""
+		aa = l.split(None, 1)
+		if aa[0] == "%token" and len(aa) == 2 and len(aa[1].split(None, 1)) == 2:
+			(name, r) = aa[1].split(None, 1)
+		elif aa[0] == "%skip" and len(aa) == 2:
+			(name, r) = (None, aa[1])
+		else:
+			error("%s:%d: malformed lexer line." % (path, n))
+			return
+		try:
+			if re.compile(r).groups != 0:
+				error("%s:%d: capturing groups are not supported, use (?:...)."
+					% (path, n))
+			else:
+				self.lexer.append((name, r))
+		except re.error as e:
+			error("%s:%d: bad regular expression: %s" % (path, n, e))
+
 	def parse_text(self, path, text):
 		self.parse(path, text.split("\n"))
 
@@ -265,21 +298,21 @@ class ParseTree:
 	def prepend_child(self, child):
 		self.children.insert(0, child)
 
-	def write_rec(self, out, pref, last):
-		out.write(pref)
-		out.write(self.sym)
-		if self.children == []:
-			out.write("\n")
-		else:
-			out.write(" +\n")
-			if last:
-				pref = pref[:-2] + "  "
-			pref = pref + " "*len(self.sym) + " | "
-			for child in self.children:
-				child.write_rec(out, pref, child == self.children[-1])
-
 	def write(self, out):
-		self.write_rec(out, "", True)
+		todo = [(self, "", True)]
+		while todo != []:
+			(t, pref, last) = todo.pop()
+			out.write(pref)
+			out.write(t.sym)
+			if t.children == []:
+				out.write("\n")
+			else:
+				out.write(" +\n")
+				if last:
+					pref = pref[:-2] + "  "
+				pref = pref + " "*len(t.sym) + " | "
+				for child in reversed(t.children):
+					todo.append((child, pref, child == t.children[-1]))
 
 	def __repr__(self):
 		return self.sym
@@ -315,6 +348,172 @@ class ParseTree:
 		out.write("}\n")
 
 
+# Resource management
+class ResourceError(Exception):
+	"""Raised when a computation exceeds the limits of the governor."""
+	pass
+
+
+class Governor:
+	"""Enforces limits on the first/follow computations: the maximal
+	number of words in a set, the maximal amount of memory in bytes
+	(added to the memory used when the governor starts) and the maximal
+	time in seconds. When a limit is exceeded, abort is called with
+	a message naming the offending non-terminal or, if abort is None,
+	ResourceError is raised. A governor is enabled by storing it in
+	GOVERNOR."""
+
+	def __init__(self, words = None, memory = None, time = None, abort = None):
+		self.words = words
+		self.memory = memory
+		self.time = time
+		self.abort = abort
+		self.start()
+
+	def start(self):
+		"""Start the time and memory measurement."""
+		if self.time != None:
+			self.deadline = time.monotonic() + self.time
+		if self.memory != None:
+			self.max_rss = get_rss() + self.memory
+		self.count = 0
+
+	def exceed(self, msg):
+		if self.abort != None:
+			self.abort(msg)
+		raise ResourceError(msg)
+
+	def check(self, kind, k, X, S):
+		"""Check the limits after building the set S for kind_k(X)."""
+		if self.words != None and len(S) > self.words:
+			self.exceed("%s%d(%s): more than %d words" % (kind, k, X, self.words))
+		self.count = self.count + 1
+		if self.count % GOVERNOR_PERIOD != 0:
+			return
+		if self.time != None and time.monotonic() > self.deadline:
+			self.exceed("%s%d(%s): time limit of %ss exceeded" \
+				% (kind, k, X, self.time))
+		if self.memory != None and get_rss() > self.max_rss:
+			self.exceed("%s%d(%s): memory limit of %d MB exceeded" \
+				% (kind, k, X, self.memory >> 20))
+
+# current governor (if any) and number of checks between time/memory checks
+GOVERNOR = None
+GOVERNOR_PERIOD = 64
+
+def get_rss():
+	"""Get the current resident memory of the process in bytes. Where
+	/proc is not available, fall back to the peak resident memory
+	(ru_maxrss is in bytes on macOS and in KiB elsewhere)."""
+	try:
+		with open("/proc/self/statm") as f:
+			return int(f.read().split()[1]) * resource.getpagesize()
+	except (OSError, ValueError, IndexError):
+		rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		if sys.platform == "darwin":
+			return rss
+		else:
+			return rss << 10
+
+
+def estimate(k, G):
+	"""Compute cheap upper bounds of |first_k(X)| and |follow_k(X)| for
+	each non-terminal X from the number of tokens and the structure of
+	the grammar. Returns a pair of dictionaries (first bounds, follow
+	bounds)."""
+	T = len(G.tokens)
+
+	# A set of words is bounded by a vector v of size 2k+1: v[l] for l < k
+	# bounds the number of words of length l and v[k + m] for 1 <= m <= k
+	# the number of prefixes of length m of the words longer than m.
+	def cap(v, t):
+		return [min(v[l], t ** l) for l in range(0, k)] \
+			+ [0] + [min(v[k + m], t ** m) for m in range(1, k + 1)]
+	def cat(A, B, t):
+		r = [0] * (2 * k + 1)
+		for i in range(0, k):
+			if A[i] != 0:
+				for j in range(0, k - i):
+					r[i + j] += A[i] * B[j]
+				for m in range(i + 1, k + 1):
+					r[k + m] += A[i] * B[k + m - i]
+		for m in range(1, k + 1):
+			r[k + m] += A[k + m]
+		return cap(r, t)
+	def add(A, B):
+		return [a + b for (a, b) in zip(A, B)]
+	def size(v):
+		return sum(v[:k]) + v[2 * k]
+	if k == 0:
+		return ({ X: 1 for X in G.names }, { X: 1 for X in G.names })
+	zero = [0] * (2 * k + 1)
+	eps = [1] + [0] * (2 * k)
+	tok = list(zero)
+	if k > 1:
+		tok[1] = 1
+	tok[k + 1] = 1
+	end = [0] * (k + 1) + [1] * k
+	def seq(s, F, t):
+		r = eps
+		for a in s:
+			if a in F:
+				r = cat(r, F[a], t)
+			else:
+				r = cat(r, tok, t)
+		return r
+	def fix(F, t, update):
+		# iterate by batches, forcing to the cap the non-converging vectors
+		while True:
+			for i in range(0, len(F) * (k + 1) + 1):
+				changed = update()
+				if changed == set():
+					return
+			for X in changed:
+				F[X] = cap([t ** k] * (2 * k + 1), t)
+	rules = G.get_rules()
+
+	# first bounds
+	F = { X: zero for X in G.names }
+	def update_first():
+		N = { X: zero for X in G.names }
+		for rule in rules:
+			if rule.w != Word(rule.X):
+				N[rule.X] = add(N[rule.X], seq(rule.w, F, T))
+		changed = set()
+		for X in G.names:
+			v = cap([max(a, b) for (a, b) in zip(N[X], F[X])], T)
+			if v != F[X]:
+				changed.add(X)
+				F[X] = v
+		return changed
+	fix(F, T, update_first)
+
+	# follow bounds
+	Fo = { X: zero for X in G.names }
+	def update_follow():
+		N = { X: zero for X in G.names }
+		for rule in rules:
+			if rule.X == G.top:
+				N[rule.w[0]] = add(N[rule.w[0]], end)
+				continue
+			for i in range(0, len(rule.w)):
+				X = rule.w[i]
+				if X in Fo and (X != rule.X or i != len(rule.w) - 1):
+					v = cat(seq(rule.w[i+1:], F, T + 1), Fo[rule.X], T + 1)
+					N[X] = add(N[X], v)
+		changed = set()
+		for X in G.names:
+			v = cap([max(a, b) for (a, b) in zip(N[X], Fo[X])], T + 1)
+			if v != Fo[X]:
+				changed.add(X)
+				Fo[X] = v
+		return changed
+	fix(Fo, T + 1, update_follow)
+
+	return ({ X: size(v) for (X, v) in F.items() },
+		{ X: size(v) for (X, v) in Fo.items() })
+
+
 # Language computation
 def first(k, s, g):
 	"""Compute first_k(s)."""
@@ -325,29 +524,46 @@ def first(k, s, g):
 		r = {s.first() + p for p in first(k-1, s.tail(), g)}
 	else:
 		r = {w for ss in g.rules_for(s[0])
-				if ss == [] or ss[0] != s[0]
+				if ss.is_empty() or ss[0] != s[0]
 					for w in first(k, ss + s[1:], g)}
+		if GOVERNOR != None:
+			GOVERNOR.check("first", k, s[0], r)
 	return r
 
 
-def firstfollow(k, X, s, G, L):
+def firstfollow(k, X, s, G, L, M = None):
+	"""Compute first_k(s follow(X)). L is the set of pairs (k, X) whose
+	follow_k(X) is being computed and M the approximations of these
+	follows used to cut the cycles of the recursion (see follow())."""
 	#print("call firstfollow%d(%s, %s)" % (k, X, s))
 	P = first(k, s, G)
-	m = max([k - len(p) for p in P])
+	r = set()
+	if (k, X) in L and EMPTY_WORD in P:
+		# follow(X) is already being computed: use its approximation
+		P = P - { EMPTY_WORD }
+		r = set(M.get((k, X), set()))
+	m = max([k - len(p) for p in P], default = 0)
 	if m == 0:
-		r = P
+		r |= P
 	else:
-		F = rec_follow(m, X, G, L)
-		r = {(p + f)[:k] for f in F for p in P}
+		if M == None:
+			F = follow(m, X, G)
+		else:
+			F = rec_follow(m, X, G, L, M)
+		r |= {(p + f)[:k] for f in F for p in P}
 	#print("return firstfollow%d(%s, %s) = %s" % (k, X, s, r))
 	return r
 
 
-def rec_follow(k, X, G, L = set()):
+def rec_follow(k, X, G, L, M):
 	"""Compute followk(X) in grammar G in a recursive way.
-	L is the link list of recursive follow to avoid endless linkage."""
+	L is the set of pairs (k, X) of the follows being computed, to
+	avoid endless linkage, and M the approximations of the follows
+	(see firstfollow())."""
 	#print("DEBUG: call rec_follow%d(%s)" % (k, X))
-	L = L | { X }
+	if (k, X) in G.follows:
+		return G.follows[(k, X)]
+	L = L | { (k, X) }
 	if k == 0:
 		r = { EMPTY_WORD }
 	else:
@@ -367,12 +583,367 @@ def rec_follow(k, X, G, L = set()):
 				if i < len(rule.w):
 					i = i + 1
 					w = rule.w[i:]
-					if len(w) != 0 or rule.X not in L:
-						r |= firstfollow(k, rule.X, w, G, L)
+					r |= firstfollow(k, rule.X, w, G, L, M)
+					if GOVERNOR != None:
+						GOVERNOR.check("follow", k, X, r)
 
+	M[(k, X)] = M.get((k, X), set()) | r
 	#print("DEBUG: return rec_follow%d(%s) = %s" % (k, X, r))
 	return r
 
+
 def follow(k, X, G):
-	"""Compute follow_k(X)."""
-	return rec_follow(k, X, G)
+	"""Compute follow_k(X). The recursion of rec_follow() is repeated
+	until the approximations used at its cycles stop growing. The result
+	is kept in the grammar: it is computed once for each k and X."""
+	if (k, X) not in G.follows:
+		M = {}
+		n = -1
+		while n != sum(len(S) for S in M.values()):
+			n = sum(len(S) for S in M.values())
+			r = rec_follow(k, X, G, set(), M)
+		G.follows[(k, X)] = r
+	return G.follows[(k, X)]
+
+
+# Incremental computation
+def concat(k, A, B):
+	"""Compute the k-concatenation of the word sets A and B, that is,
+	the set of prefixes of length k of the words of A.B."""
+	r = set()
+	for a in A:
+		if len(a) >= k:
+			r.add(a)
+		else:
+			for b in B:
+				r.add((a + b)[:k])
+	return r
+
+
+class FirstFollow:
+	"""Computes first_k and follow_k sets of all non-terminals of a
+	grammar for increasing values of k (by calls to next()). The words
+	of first_(k-1) and follow_(k-1) shorter than k-1 come from complete
+	derivations and stay in the sets of rank k: only the words of length
+	k-1 are extended by the symbols that may follow them. These symbols
+	are computed as a fixpoint over the (X, word) pairs. Only the
+	productive rules and the reachable non-terminals are considered."""
+
+	def __init__(self, G):
+		self.G = G
+		self.k = 0
+		self.firsts = { X: set() for X in G.names }
+		self.follows = { X: set() for X in G.names }
+		self.contexts = {}
+
+		# first_0(X) = { ε } for the productive non-terminals
+		changed = True
+		while changed:
+			changed = False
+			for rule in G.get_rules():
+				if self.firsts[rule.X] == set() and self.is_productive(rule.w):
+					self.firsts[rule.X] = { EMPTY_WORD }
+					changed = True
+		self.rules = { X: [] for X in G.names }
+		for rule in G.get_rules():
+			if self.is_productive(rule.w):
+				self.rules[rule.X].append(rule)
+
+		# follow_0(X) = { ε } for the reachable non-terminals
+		todo = [G.top]
+		while todo != []:
+			for rule in self.rules[todo.pop()]:
+				for X in rule.w:
+					if X in self.follows and self.follows[X] == set():
+						self.follows[X] = { EMPTY_WORD }
+						todo.append(X)
+
+	def is_productive(self, s):
+		"""Test if the word s derives a word of terminals."""
+		return all(a not in self.firsts or self.firsts[a] != set() for a in s)
+
+	def first_of(self, s):
+		"""Compute first_k(s) for the current k."""
+		r = { EMPTY_WORD }
+		for a in s:
+			if a in self.firsts:
+				r = concat(self.k, r, self.firsts[a])
+			else:
+				r = { w if len(w) >= self.k else w + a for w in r }
+			if all(len(w) >= self.k for w in r):
+				break
+		return r
+
+	def next(self):
+		"""Compute the sets for the next value of k."""
+		self.k = self.k + 1
+		self.firsts = self.extend("first", self.firsts, self.next_first)
+		self.contexts = { X: [] for X in self.G.names }
+		for (Z, rules) in self.rules.items():
+			if Z == self.G.top or self.follows[Z] == set():
+				continue
+			for rule in rules:
+				for i in range(0, len(rule.w)):
+					if rule.w[i] in self.contexts:
+						self.contexts[rule.w[i]].append(
+							(Z, self.first_of(rule.w[i+1:])))
+		self.follows = self.extend("follow", self.follows, self.next_follow)
+
+	def extend(self, kind, sets, fun):
+		"""Build the sets of rank k from the sets of rank k-1: fun(X, u,
+		E) gives the symbols that may follow the word u of length k-1
+		in the set of X (None if u ends the word) with E the symbols
+		already found for the other pairs."""
+		n = self.k - 1
+		E = { (X, u): set() for (X, S) in sets.items() for u in S if len(u) == n }
+		changed = True
+		while changed:
+			changed = False
+			for ((X, u), N) in E.items():
+				r = fun(X, u, E)
+				if not r <= N:
+					N |= r
+					changed = True
+					if GOVERNOR != None:
+						GOVERNOR.check(kind, self.k, X, N)
+		R = { X: { w for w in S if len(w) < n } for (X, S) in sets.items() }
+		for ((X, u), N) in E.items():
+			R[X] |= { u if a == None else u + a for a in N }
+		if GOVERNOR != None:
+			for (X, S) in R.items():
+				GOVERNOR.check(kind, self.k, X, S)
+		return R
+
+	def next_first(self, X, u, E):
+		"""Get the symbols following u in first_k(X): the rules of X
+		are matched against u with the first_(k-1) sets, each position
+		of the matching being the length of u matched so far."""
+		n = len(u)
+		r = set()
+		for rule in self.rules[X]:
+			P = { 0 }
+			for a in rule.w:
+				Q = set()
+				for i in P:
+					if a not in self.firsts:
+						if i == n:
+							r.add(a)
+						elif u[i] == a:
+							Q.add(i + 1)
+						continue
+					if i == 0:
+						for b in E.get((a, u), ()):
+							if b == None:
+								Q.add(n)
+							else:
+								r.add(b)
+					for v in self.firsts[a]:
+						m = len(v)
+						if i == 0 and m == n:
+							continue
+						elif m < n and i + m <= n:
+							if v.chars == u.chars[i:i+m]:
+								Q.add(i + m)
+						elif v.chars[:n-i] == u.chars[i:]:
+							r.add(v[n-i])
+				P = Q
+				if P == set():
+					break
+			if n in P:
+				r.add(None)
+		return r
+
+	def next_follow(self, X, u, E):
+		"""Get the symbols following u in follow_k(X) from the first_k
+		sets of the contexts of X and the follow_(k-1) sets."""
+		n = len(u)
+		r = set()
+		if X == self.G.rules[0].w[0] and u == Word("$") * n:
+			r.add("$")
+		for (Z, F) in self.contexts[X]:
+			for w in F:
+				m = len(w)
+				if m == 0:
+					r |= E.get((Z, u), set())
+				elif m > n:
+					if w.chars[:n] == u.chars:
+						r.add(w[n])
+				elif w.chars == u.chars[:m]:
+					for f in self.follows[Z]:
+						if len(f) > n - m and f.chars[:n-m] == u.chars[m:]:
+							r.add(f[n-m])
+		return r
+
+	def first(self, X):
+		"""Get first_k(X) for the current k."""
+		return self.firsts[X]
+
+	def follow(self, X):
+		"""Get follow_k(X) for the current k."""
+		return self.follows[X]
+
+	def lookahead(self, X, s):
+		"""Get the k-lookahead of rule X -> s for the current k."""
+		if X == self.G.top:
+			F = { Word("$") * self.k }
+		else:
+			F = self.follows[X]
+		return concat(self.k, self.first_of(s), F)
+
+
+# Linear approximation
+class LinearSet:
+	"""Linear approximation of a set of words of length at most k: it
+	records the set of symbols that can appear at each position 0..k-1
+	and the set of lengths of the words shorter than k. Its size is
+	linear in k whatever the number of words."""
+
+	def __init__(self, k, pos = None, lengths = None):
+		self.k = k
+		if pos == None:
+			pos = [set() for i in range(0, k)]
+		self.pos = pos
+		if lengths == None:
+			lengths = set()
+		self.lengths = lengths
+
+	@staticmethod
+	def of_word(k, w):
+		"""Build the linear set containing the word w."""
+		S = LinearSet(k)
+		S.add(w)
+		return S
+
+	def add(self, w):
+		"""Add the word w to the set."""
+		for i in range(0, min(len(w), self.k)):
+			self.pos[i].add(w[i])
+		if len(w) < self.k:
+			self.lengths.add(len(w))
+
+	def is_empty(self):
+		return self.lengths == set() and all(p == set() for p in self.pos)
+
+	def concat(self, S):
+		"""Compute the k-concatenation of this set with S."""
+		if self.is_empty() or S.is_empty():
+			return LinearSet(self.k)
+		pos = [set(p) for p in self.pos]
+		for l in self.lengths:
+			for i in range(l, self.k):
+				pos[i] |= S.pos[i - l]
+		lengths = { a + b for a in self.lengths for b in S.lengths
+			if a + b < self.k }
+		return LinearSet(self.k, pos, lengths)
+
+	def update(self, S):
+		"""Add the content of S to this set and return True if the
+		set has changed."""
+		changed = not S.lengths <= self.lengths
+		self.lengths |= S.lengths
+		for i in range(0, self.k):
+			if not S.pos[i] <= self.pos[i]:
+				self.pos[i] |= S.pos[i]
+				changed = True
+		return changed
+
+	def matches(self, w, n):
+		"""Test if the n first symbols of w are compatible with the set."""
+		return all(w[i] in self.pos[i] for i in range(0, n))
+
+	def __contains__(self, w):
+		if len(w) < self.k:
+			return len(w) in self.lengths and self.matches(w, len(w))
+		else:
+			return self.matches(w, self.k)
+
+	def __and__(self, S):
+		return LinearSet(self.k,
+			[self.pos[i] & S.pos[i] for i in range(0, self.k)],
+			self.lengths & S.lengths)
+
+	def __bool__(self):
+		"""True if the approximation may contain a word."""
+		return all(p != set() for p in self.pos) \
+			or any(all(p != set() for p in self.pos[:l]) for l in self.lengths)
+
+	def __eq__(self, S):
+		return isinstance(S, LinearSet) and self.pos == S.pos \
+			and self.lengths == S.lengths
+
+	def __str__(self):
+		return " ".join("{%s}" % ", ".join(sorted(p)) for p in self.pos)
+
+	def __repr__(self):
+		return self.__str__()
+
+
+class LinearFirstFollow:
+	"""Computes the linear approximations of first_k and follow_k of all
+	non-terminals of a grammar. Time and memory are polynomial in k."""
+
+	def __init__(self, k, G):
+		self.k = k
+		self.G = G
+		self.eps = LinearSet.of_word(k, EMPTY_WORD)
+		self.end = LinearSet.of_word(k, Word("$") * k)
+		self.tokens = {}
+		rules = G.get_rules()
+
+		# compute first
+		self.firsts = { X: LinearSet(k) for X in G.names }
+		changed = True
+		while changed:
+			changed = False
+			for rule in rules:
+				if self.firsts[rule.X].update(self.first_of(rule.w)):
+					changed = True
+
+		# compute follow
+		self.follows = { X: LinearSet(k) for X in G.names }
+		for rule in rules:
+			if rule.X == G.top:
+				self.follows[rule.w[0]].update(self.end)
+		changed = True
+		while changed:
+			changed = False
+			for rule in rules:
+				if rule.X == G.top:
+					continue
+				for i in range(0, len(rule.w)):
+					X = rule.w[i]
+					if X in self.follows:
+						S = self.first_of(rule.w[i+1:]) \
+							.concat(self.follows[rule.X])
+						if self.follows[X].update(S):
+							changed = True
+
+	def first_of(self, s):
+		"""Compute the linear first_k of s."""
+		r = self.eps
+		for a in s:
+			if a in self.firsts:
+				S = self.firsts[a]
+			else:
+				S = self.tokens.get(a)
+				if S == None:
+					S = LinearSet.of_word(self.k, Word(a))
+					self.tokens[a] = S
+			r = r.concat(S)
+			if r.lengths == set():
+				break
+		return r
+
+	def first(self, X):
+		return self.firsts[X]
+
+	def follow(self, X):
+		return self.follows[X]
+
+	def lookahead(self, X, s):
+		"""Get the linear k-lookahead of the rule X -> s."""
+		if X == self.G.top:
+			F = self.end
+		else:
+			F = self.follows[X]
+		return self.first_of(s).concat(F)
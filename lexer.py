@@ -0,0 +1,255 @@
+#
+#	Language Theory GENerator
+#	Copyright (C) 2021  Hugues Cassé <hug.casse@gmail.com>
+#
+#	This program is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	This program is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+"""Regular expression lexer producing token streams for the parsers.
+
+The lexer is described in the grammar file by lines:
+  * %token NAME REGEX -- NAME tokens are made of text matching REGEX,
+  * %skip REGEX -- text matching REGEX is ignored (spaces, comments).
+The tokens of the grammar without %token line are matched literally.
+
+All the expressions are compiled in a single bytes regular expression
+trying in order the skipped expressions, the literal tokens (longest
+first, a literal ending with a letter or a digit can not be followed by
+a letter or a digit) and the %token expressions. As each expression is
+a group of this regular expression, the expressions can not contain
+capturing groups or back references: (?:...) has to be used instead.
+The source files are scanned through mmap and the tokens are produced
+on demand by a Stream, which is used by the parsers in place of a
+Word."""
+
+import mmap
+import re
+
+from common import *
+from lang import *
+
+# number of consumed tokens kept by a stream source
+KEEP = 1 << 16
+
+
+class LexerError(Exception):
+	"""Raised when a text can not be split into tokens."""
+	pass
+
+
+def location(buf, pos):
+	"""Get the (line, column) of offset pos in buffer buf."""
+	return next(locations(buf, [pos]))
+
+
+def locations(buf, offsets):
+	"""Generate the (line, column) of the increasing offsets in buffer
+	buf (scanned only once)."""
+	line = 1
+	start = 0
+	for pos in offsets:
+		i = buf.find(b"\n", start, pos)
+		while i >= 0:
+			line = line + 1
+			start = i + 1
+			i = buf.find(b"\n", start, pos)
+		yield (line, pos - start + 1)
+
+
+# Lexer class
+class Lexer:
+	"""Lexer built from the list tokens of (name, regex), the list of
+	skipped regexes and the list of literal tokens."""
+
+	def __init__(self, tokens, skips = [], literals = []):
+		alts = [(None, r) for r in skips]
+		for a in sorted(literals, key = lambda a: -len(a)):
+			r = re.escape(a)
+			if re.match(r"\w", a[-1]):
+				r = r + r"(?!\w)"
+			alts.append((a, r))
+		alts += tokens
+		self.names = {}
+		exprs = []
+		for (i, (name, r)) in enumerate(alts):
+			if re.compile(r).groups != 0:
+				raise LexerError("capturing group in regular expression %s" % r)
+			self.names[i + 1] = name
+			exprs.append("(%s)" % r)
+		self.regex = re.compile("|".join(exprs).encode("utf-8"))
+
+	def scan(self, buf, path = "<input>"):
+		"""Generate the tokens of buffer buf as (name, start, end)."""
+		match = self.regex.match
+		names = self.names
+		pos = 0
+		n = len(buf)
+		while pos < n:
+			m = match(buf, pos)
+			if m == None or m.end() == pos:
+				(l, c) = location(buf, pos)
+				raise LexerError("%s:%d:%d: unexpected character %r"
+					% (path, l, c, bytes(buf[pos:pos + 1]).decode("latin-1")))
+			name = names[m.lastindex]
+			if name != None:
+				yield (name, pos, m.end())
+			pos = m.end()
+
+	def stream(self, buf, path = "<input>"):
+		"""Get the stream of tokens of buffer buf."""
+		return Stream(Source(self, buf, path))
+
+	def open(self, path):
+		"""Get the stream of tokens of the file at path (mapped in
+		memory). The stream has to be closed after use."""
+		f = open(path, "rb")
+		try:
+			buf = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+		except ValueError:
+			buf = b""
+		f.close()
+		return self.stream(buf, path)
+
+
+def for_grammar(G):
+	"""Build the lexer described in grammar G (None if there is none)."""
+	if G.lexer == []:
+		return None
+	tokens = [(name, r) for (name, r) in G.lexer if name != None]
+	skips = [r for (name, r) in G.lexer if name == None]
+	defined = { name for (name, r) in tokens }
+	return Lexer(tokens, skips, [a for a in G.tokens if a not in defined])
+
+
+# Source class
+class Source:
+	"""Tokens of a buffer scanned on demand. Only the tokens from KEEP
+	tokens before the last released position are kept."""
+
+	def __init__(self, lexer, buf, path):
+		self.buf = buf
+		self.path = path
+		self.tokens = lexer.scan(buf, path)
+		self.list = []
+		self.base = 0
+		self.length = None
+
+	def get(self, i):
+		"""Get token i as (name, start, end) or None after the end."""
+		j = i - self.base
+		if j < len(self.list):
+			return self.list[j]
+		while self.length == None and i >= self.base + len(self.list):
+			try:
+				self.list.append(next(self.tokens))
+			except StopIteration:
+				self.length = self.base + len(self.list)
+		if i < self.base + len(self.list):
+			return self.list[i - self.base]
+		return None
+
+	def release(self, i):
+		"""Tell that tokens before i are no more needed."""
+		if i - self.base > 2 * KEEP:
+			n = i - self.base - KEEP
+			del self.list[:n]
+			self.base = self.base + n
+
+	def close(self):
+		if isinstance(self.buf, mmap.mmap):
+			self.buf.close()
+
+
+# Stream class
+class Stream:
+	"""Word-like view of the tokens of a source starting at token pos
+	and followed by the tokens of word end. Streams are consumed from left
+	to right: only the last streams obtained by slicing can be used."""
+
+	def __init__(self, source, pos = 0, end = EMPTY_WORD):
+		self.source = source
+		self.pos = pos
+		self.end = end
+
+	def at(self, i):
+		"""Get the name of token i."""
+		t = self.source.get(self.pos + i)
+		if t != None:
+			return t[0]
+		j = self.pos + i - self.source.length
+		if j < len(self.end):
+			return self.end[j]
+		raise IndexError(i)
+
+	def is_empty(self):
+		return self.source.get(self.pos) == None \
+			and self.pos >= self.source.length + len(self.end)
+
+	def location(self):
+		"""Get the (line, column) of the first token or None at end."""
+		t = self.source.get(self.pos)
+		if t == None:
+			return None
+		return location(self.source.buf, t[1])
+
+	def offset(self):
+		"""Get the offset of the first token in the buffer (or None at
+		end)."""
+		t = self.source.get(self.pos)
+		if t == None:
+			return None
+		return t[1]
+
+	def text(self):
+		"""Get the text of the first token (or None at end)."""
+		t = self.source.get(self.pos)
+		if t == None:
+			return None
+		return bytes(self.source.buf[t[1]:t[2]]).decode("utf-8", "replace")
+
+	def close(self):
+		self.source.close()
+
+	def __getitem__(self, i):
+		if type(i) == int:
+			return self.at(i)
+		start = 0 if i.start == None else i.start
+		if i.stop == None:
+			self.source.release(self.pos + start)
+			return Stream(self.source, self.pos + start, self.end)
+		r = []
+		try:
+			for j in range(start, i.stop):
+				r.append(self.at(j))
+		except IndexError:
+			pass
+		return Word(*r)
+
+	def __add__(self, w):
+		return Stream(self.source, self.pos, self.end + w)
+
+	def __iter__(self):
+		i = 0
+		while True:
+			try:
+				yield self.at(i)
+			except IndexError:
+				return
+			i = i + 1
+
+	def __str__(self):
+		w = self[:8]
+		if len(w) < 8:
+			return str(w)
+		return "%s ..." % w
@@ -18,16 +18,70 @@
 
 """LL(k) parser generator and analyzer."""
 
+import json
+import os.path
+import struct
+import time
+
 from common import *
 from lang import *
 
 # special values
 ACCEPT = -2
 ERROR = -1
+RECOVER = -3
+
+# number of tokens between the snapshots of an incremental parser
+SNAPSHOT_STEP = 256
 
 # Analysis
 def lookahead(k, X, s, G):
-	return firstfollow(k, X, s, G, {X})
+	if X == G.top:
+		return concat(k, first(k, s, G), { Word("$") * k })
+	return firstfollow(k, X, s, G, set())
+
+
+def rule_lookaheads(k, X, G, la = lookahead):
+	"""Compute the lookaheads of the rules of X as a list of (rule number,
+	non-terminal, symbol sequence, look-ahead words). la is the function
+	used to compute the lookahead of a rule."""
+	rs = []
+	n = 0
+	for rule in G.get_rules():
+		if X == rule.X:
+			rs.append((n, X, rule.w, la(k, X, rule.w, G)))
+		n = n + 1
+	return rs
+
+
+def conflicts(rs):
+	"""Find the conflicts between the rule lookaheads rs (as produced by
+	rule_lookaheads()). Return a list of (rule number, rule number,
+	conflicting words)."""
+	cs = []
+	for i in range(0, len(rs)):
+		for j in range(i+1, len(rs)):
+			I = rs[i][3] & rs[j][3]
+			if I:
+				cs.append((rs[i][0], rs[j][0], I))
+	return cs
+
+
+def lookahead_to_str(l):
+	"""Convert a lookahead (word set or linear set) to string."""
+	if isinstance(l, LinearSet):
+		return str(l)
+	else:
+		return word_set_to_str(l)
+
+
+def conflicts_to_str(k, rs, cs):
+	"""Build the lines describing the conflicts cs of rule lookaheads rs."""
+	ls = ["(%d) %d-lookahead(%s -> %s) = %s" \
+			% (n, k, X, s, lookahead_to_str(l)) for (n, X, s, l) in rs]
+	ls += ["I%d conflicts with I%d: %s" % (i, j, lookahead_to_str(I))
+		for (i, j, I) in cs]
+	return ls
 
 
 def analyze(k, G):
@@ -37,31 +91,71 @@ def analyze(k, G):
 	total_success = True
 	las = []
 	for X in G.names:
+		rs = rule_lookaheads(k, X, G)
+		las += rs
+		cs = conflicts(rs)
+		if cs != []:
+			total_success = False
+			for l in conflicts_to_str(k, rs, cs):
+				output(l)
 
-		# compute lookahead
-		rs = []
-		n = 0
-		for rule in G.get_rules():
-			if X == rule.X:
-				rs.append((n, X, rule.w, lookahead(k, X, rule.w, G)))
-			n = n + 1
+	if total_success:
+		return las
+	else:
+		return None
+
+
+def analyze_adaptive(K, G):
+	"""Perform an adaptive LL analysis: the lookahead depth of each
+	non-terminal starts at 1 and is only raised, up to K, while its rules
+	conflict. If successful, returns (lookaheads, depths) where
+	lookaheads is as for analyze() and depths maps each non-terminal to
+	its minimal depth."""
+	total_success = True
+	las = []
+	ks = {}
+	for X in G.names:
+		k = 1
+		rs = rule_lookaheads(k, X, G)
+		cs = conflicts(rs)
+		while cs != [] and k < K:
+			k = k + 1
+			rs = rule_lookaheads(k, X, G)
+			cs = conflicts(rs)
 		las += rs
+		ks[X] = k
+		if cs != []:
+			total_success = False
+			for l in conflicts_to_str(k, rs, cs):
+				output(l)
+
+	if total_success:
+		return (las, ks)
+	else:
+		return None
 
-		# check if the intersection is empty
-		success = True
-		for i in range(0, len(rs)):
-			for j in range(i+1, len(rs)):
-				I = rs[i][3] & rs[j][3]
-				if I != set():
-					if success:
-						success = False
-						for (n, X, s, l) in rs:
-							print("(%d) %d-lookahead(%s -> %s) = %s" \
-								%(n, k, X, s, word_set_to_str(l)))
-					print("I%d conflicts with I%d: %s" \
-						% (rs[i][0], rs[j][0], word_set_to_str(I)))
-
-		total_success &= success
+
+def analyze_linear(k, G):
+	"""Perform a LL(k) analysis using linear-approximate lookaheads
+	(one set of symbols per position). The exact analysis is only
+	performed for the non-terminals whose approximate lookaheads
+	conflict. If successful, returns the lookaheads as analyze() but a
+	lookahead is a LinearSet or, for the non-terminals that needed the
+	exact analysis, a set of words."""
+	L = LinearFirstFollow(k, G)
+	la = lambda k, X, s, G: L.lookahead(X, s)
+	total_success = True
+	las = []
+	for X in G.names:
+		rs = rule_lookaheads(k, X, G, la)
+		if conflicts(rs) != []:
+			rs = rule_lookaheads(k, X, G)
+			cs = conflicts(rs)
+			if cs != []:
+				total_success = False
+				for l in conflicts_to_str(k, rs, cs):
+					output(l)
+		las += rs
 
 	if total_success:
 		return las
@@ -69,21 +163,159 @@ def analyze(k, G):
 		return None
 
 
+def sweep(K, G, kmin = 1):
+	"""Look for the smallest k in kmin..K such that G is LL(k). The first
+	and follow sets of depth k are built incrementally from the ones of
+	depth k-1. Generates (k, lookaheads or None, time in seconds) for
+	each depth from kmin and stops at the first depth without conflict.
+	The time of kmin includes the building of the sets of the smaller
+	depths."""
+	ff = FirstFollow(G)
+	la = lambda k, X, s, G: ff.lookahead(X, s)
+	start = time.perf_counter()
+	for k in range(1, K + 1):
+		ff.next()
+		if k < kmin:
+			continue
+		las = []
+		for X in G.names:
+			rs = rule_lookaheads(k, X, G, la)
+			if conflicts(rs) != []:
+				las = None
+				break
+			las += rs
+		yield (k, las, time.perf_counter() - start)
+		if las != None:
+			break
+		start = time.perf_counter()
+
+
+def sync_sets(k, G):
+	"""Compute the synchronization sets used by the parser to recover
+	from the errors: follow_k of each non-terminal."""
+	ff = FirstFollow(G)
+	for i in range(0, k):
+		ff.next()
+	S = { X: ff.follow(X) for X in G.names }
+	S[G.top] = { Word("$") * k }
+	return S
+
+
+class ParseError:
+	"""Syntax error found by the parser after pos tokens: found is the
+	lookahead and expected the list of the lookaheads accepted at this
+	point. For a token stream, offset and text are the offset and the
+	text of the erroneous token."""
+
+	def __init__(self, pos, found, expected, offset = None, text = None):
+		self.pos = pos
+		self.found = found
+		self.expected = expected
+		self.offset = offset
+		self.text = text
+
+	def expected_to_str(self, max = 8):
+		"""Build the text listing the max first expected lookaheads."""
+		l = sorted(str(w) for w in self.expected)
+		if len(l) > max:
+			l = l[:max] + ["..."]
+		return ", ".join(l)
+
+	def __str__(self):
+		return "syntax error at %s (token %d), expected %s" \
+			% (self.found, self.pos, self.expected_to_str())
+
+
+class ConflictError(Exception):
+	"""Raised when the rules of a non-terminal conflict. lines describes
+	the lookaheads and the conflicts."""
+
+	def __init__(self, X, lines):
+		Exception.__init__(self, "conflict on %s" % X)
+		self.X = X
+		self.lines = lines
+
+
+# WordView class
+class WordView:
+	"""Word-like view of the tokens of tuple chars from position pos
+	followed by the tokens of word end: slicing a suffix does not copy
+	the tokens."""
+
+	def __init__(self, chars, pos = 0, end = EMPTY_WORD):
+		self.chars = chars
+		self.pos = pos
+		self.end = end
+
+	def is_empty(self):
+		return self.pos >= len(self.chars) + len(self.end)
+
+	def __len__(self):
+		return len(self.chars) + len(self.end) - self.pos
+
+	def __getitem__(self, i):
+		if type(i) == int:
+			i = self.pos + i
+			if i < len(self.chars):
+				return self.chars[i]
+			return self.end[i - len(self.chars)]
+		start = self.pos + (0 if i.start == None else i.start)
+		if i.stop == None:
+			return WordView(self.chars, start, self.end)
+		stop = self.pos + i.stop
+		return Word(*(self.chars[start:stop]
+			+ self.end.chars[max(0, start - len(self.chars)):max(0, stop - len(self.chars))]))
+
+	def __add__(self, w):
+		return WordView(self.chars, self.pos, self.end + w)
+
+	def __iter__(self):
+		for i in range(0, len(self)):
+			yield self[i]
+
+	def __str__(self):
+		return str(Word(*self))
+
+
 # Parser class
 class Parser:
 	"""Class to scan a word from the given LL table.
 	The scanner takes a word and performs analysis along the call to next.
 	Analysis results can be polled from variablmes stack, word and action.
 	Action takes the last expanded rule number, the popped terminal or
-	special ERROR or ACCEPT."""
+	special ERROR or ACCEPT.
+
+	If the synchronization sets sync (as computed by sync_sets()) are
+	given, the parser recovers from the errors in panic mode: the action
+	is then RECOVER, the errors are recorded in errors (as ParseError)
+	and the parsing ends with ERROR at the end of the word. After an
+	error, the next errors are only recorded once a token is matched."""
 
-	def __init__(self, table, word):
+	def __init__(self, table, word, sync = None):
 		self.G = table.G
 		self.k = table.k
 		self.table = table
 		self.word = word + Word('$') * self.k
 		self.stack = Word(*('$' * self.k), self.G.get_top())
 		self.action = 0
+		self.sync = sync
+		self.pos = 0
+		self.errors = []
+		self.quiet = False
+
+	def snapshot(self):
+		"""Get a snapshot of the parser state as (position, stack). The
+		stack being an immutable word, it is not copied."""
+		return (self.pos, self.stack)
+
+	def resume(self, snapshot, word):
+		"""Restore the state of snapshot to parse word (the whole input
+		without the end markers)."""
+		(self.pos, self.stack) = snapshot
+		self.word = word[self.pos:] + Word('$') * self.k
+		self.action = 0
+		self.errors = []
+		self.quiet = False
 
 	def get_grammar(self):
 		return self.G
@@ -99,7 +331,7 @@ class Parser:
 		if self.is_ended():
 			pass
 		elif self.stack.is_empty():
-			if self.word.is_empty():
+			if self.word.is_empty() and self.errors == []:
 				self.action = ACCEPT
 			else:
 				self.action = ERROR
@@ -107,25 +339,160 @@ class Parser:
 			self.action = self.stack[-1]
 			self.stack = self.stack[:-1]
 			self.word = self.word[1:]
+			self.pos = self.pos + 1
+			self.quiet = False
 		else:
 			try:
-				self.action = self.table.at(self.stack[-1], self.word[:self.k])
+				X = self.stack[-1]
+				n = self.table.at(X, self.word[:self.table.depth(X)])
+				if n == ERROR:
+					raise KeyError(X)
+				self.action = n
 				self.stack = self.stack[0:-1]
 				x = self.G.get_rules()[self.action].w.reverse()
 				self.stack += x
 			except KeyError:
-				self.action = ERROR
-	
+				if self.sync == None:
+					self.action = ERROR
+				else:
+					self.recover(X)
+
+	def expects(self, X):
+		"""Test if the current lookahead can be parsed by X."""
+		try:
+			return self.table.at(X, self.word[:self.table.depth(X)]) != ERROR
+		except KeyError:
+			return False
+
+	def recover(self, X):
+		"""Recover from an error with X on top of the stack: a token is
+		popped (as if it was missing) and, for a non-terminal, the input
+		tokens are skipped up to a lookahead parsed by X or up to its
+		synchronization set (X is then popped)."""
+		self.action = RECOVER
+		if X not in self.sync:
+			expected = [Word(X)]
+		else:
+			expected = self.table.lookaheads(X)
+		if not self.quiet:
+			if isinstance(self.word, Word):
+				error = ParseError(self.pos, self.word[:self.k], expected)
+			else:
+				error = ParseError(self.pos, self.word[:self.k], expected,
+					self.word.offset(), self.word.text())
+			self.errors.append(error)
+			self.quiet = True
+
+		# skip the extra tokens at the end
+		if X == "$":
+			self.word = self.word[1:]
+			self.pos = self.pos + 1
+
+		# pop a missing token
+		elif X not in self.sync:
+			self.stack = self.stack[:-1]
+
+		# skip the tokens up to the synchronization set
+		else:
+			S = self.sync[X]
+			while self.word[0] != "$" and not self.expects(X) \
+			and self.word[:self.k] not in S:
+				self.word = self.word[1:]
+				self.pos = self.pos + 1
+			if not self.expects(X):
+				self.stack = self.stack[:-1]
+
+
+# IncrementalParser class
+class IncrementalParser:
+	"""Parser of a word supporting edits of the word. The parser state
+	is recorded every step tokens: an edit resumes the parsing from the
+	last snapshot not depending on the edited tokens and stops as soon as,
+	after the edited tokens, the parser is again in a state of a previous
+	parse. action and pos give the result of the last parse (ACCEPT or
+	ERROR and the position of the erroneous token).
+
+	After an error, the snapshots of the previous parses following the
+	error are kept so that the edit fixing the error can join them: ends
+	is the list of (position, action) ending the parse of each group of
+	snapshots (the first one being the current parse)."""
+
+	def __init__(self, table, word, step = SNAPSHOT_STEP):
+		self.table = table
+		self.k = table.k
+		self.step = step
+		self.chars = tuple(word)
+		self.snaps = dict([Parser(table, EMPTY_WORD).snapshot()])
+		self.run(0, {}, [], 0)
+
+	def run(self, p, old, ends, limit):
+		"""Parse from the snapshot at p. The parsing stops if, at a
+		position after limit, the state is the snapshot of old at this
+		position (ends being the ends of old). Return the number of
+		performed steps."""
+		parser = Parser(self.table, EMPTY_WORD)
+		parser.resume((p, self.snaps[p]), WordView(self.chars))
+		last = p
+		steps = 0
+		while not parser.is_ended():
+			parser.next()
+			steps = steps + 1
+			if type(parser.action) == str:
+				q = parser.pos
+				if q >= limit and q in old \
+				and (old[q] is parser.stack or old[q] == parser.stack):
+					self.snaps.update((r, s) for (r, s) in old.items() if r >= q)
+					self.ends = [(e, a) for (e, a) in ends if e >= q]
+					(self.pos, self.action) = self.ends[0]
+					return steps
+				if q - last >= self.step:
+					self.snaps[q] = parser.stack
+					last = q
+		(self.pos, self.action) = (parser.pos, parser.action)
+		if self.action == ERROR:
+			self.snaps.update((r, s) for (r, s) in old.items() if r > self.pos)
+			self.ends = [(self.pos, ERROR)] + [(e, a) for (e, a) in ends if e > self.pos]
+		else:
+			self.ends = [(self.pos, self.action)]
+		return steps
+
+	def edit(self, start, end, tokens):
+		"""Replace the tokens from start to end by the given tokens and
+		parse again. Return the number of performed steps."""
+		tokens = tuple(tokens)
+		delta = len(tokens) - (end - start)
+		self.chars = self.chars[:start] + tokens + self.chars[end:]
+		old = { r + delta: s for (r, s) in self.snaps.items() if r >= end }
+		ends = [(e + delta, a) for (e, a) in self.ends if e >= end]
+
+		# the error is before the edit
+		if self.action == ERROR and self.pos + self.k <= start:
+			self.snaps = { q: s for (q, s) in self.snaps.items() if q <= self.pos }
+			self.snaps.update(old)
+			self.ends = [(self.pos, ERROR)] + ends
+			return 0
+
+		# resume from the last snapshot before the edit and its lookahead
+		p = max(q for q in self.snaps
+			if q <= self.pos and (q == 0 or q + self.k - 2 < start))
+		self.snaps = { q: s for (q, s) in self.snaps.items() if q <= p }
+		return self.run(p, old, ends, start + len(tokens))
+
 
 # Table class
 class Table:
 	"""Represents an LL(k) table, that is, indexed by non-terminals
 	for rows and terminals for columns. Its content are the rule
-	numbers to expand or the special value ERROR."""
+	numbers to expand or the special value ERROR.
 
-	def __init__(self, k, G, las):
+	If depths is given, it maps each non-terminal to the lookahead depth
+	of its row (as produced by analyze_adaptive()) and k is the maximal
+	depth."""
+
+	def __init__(self, k, G, las, depths = None):
 		self.k = k
 		self.G = G 
+		self.depths = depths
 
 		# non-terminals
 		self.nts = list(G.names)
@@ -156,41 +523,254 @@ class Table:
 	def at(self, X, p):
 		"""Give the table value for non-terminal X and terminal a.
 		This value is the rule to expand or None for an error."""
+		if self.depths != None:
+			p = p[:self.depths[X]]
 		return self.table[self.nt_map[X]][self.la_map[p]]
 
+	def depth(self, X):
+		"""Get the lookahead depth used for non-terminal X."""
+		if self.depths == None:
+			return self.k
+		else:
+			return self.depths[X]
+
 	def get_non_terminals(self):
 		return self.nts
 
+	def lookaheads(self, X):
+		"""Get the lookaheads of the row of X."""
+		return [self.las[j] for (j, c) in enumerate(self.table[self.nt_map[X]])
+			if c != ERROR]
+
 	def get_lookaheads(self):
 		return self.las
 
+	def entries(self):
+		"""Generate the non-error entries of the table as triples
+		(non-terminal index, lookahead index, rule number)."""
+		for (i, row) in enumerate(self.table):
+			for (j, c) in enumerate(row):
+				if c != ERROR:
+					yield (i, j, c)
+
 	def write_to_csv(self, out):
 		"""Write the given table to a CSV flow."""
-		for la in self.las:
-			out.write(",%s" % la)
-		out.write("\n")
-		for X in self.nts:
-			out.write(X)
-			for c in self.table[self.nt_map[X]]:
-				out.write(",%d" % c)
-			out.write("\n")
+		out.write("".join(",%s" % la for la in self.las) + "\n")
+		out.writelines("%s,%s\n" % (X, ",".join(map(str, self.table[self.nt_map[X]])))
+			for X in self.nts)
 
 	def write(self, out):
 		"""Write the table in human readable way."""
-		for la in self.las:
-			out.write("\t%s" % la)
+		out.write("".join("\t%s" % la for la in self.las) + "\n")
+		out.writelines("%s\t%s\n" % (X, "\t".join(
+				"ERR" if c == ERROR else "(%d)" % c
+					for c in self.table[self.nt_map[X]]))
+			for X in self.nts)
+
+	def write_to_json(self, out):
+		"""Write the table as sparse JSON: the lists of non-terminals and
+		of lookaheads and the list of non-error entries as triples
+		(non-terminal index, lookahead index, rule number)."""
+		d = {
+			"k": self.k,
+			"non_terminals": self.nts,
+			"lookaheads": [list(la) for la in self.las],
+			"entries": list(self.entries())
+		}
+		if self.depths != None:
+			d["depths"] = [self.depths[X] for X in self.nts]
+		json.dump(d, out, separators = (",", ":"))
 		out.write("\n")
-		for X in self.nts:
-			out.write(X)
-			for c in self.table[self.nt_map[X]]:
-				if c == ERROR:
-					out.write("\tERR")
-				else:
-					out.write("\t(%d)" % c)
-			out.write("\n")
 
-	def parse(self, word):
-		return Parser(self, word)
+	def write_to_coo(self, out):
+		"""Write the table as COO text: one line per non-error entry
+		made of the non-terminal, the lookahead and the rule number."""
+		out.writelines("%s\t%s\t%d\n" % (self.nts[i], self.las[j], c)
+			for (i, j, c) in self.entries())
+
+	def write_to_binary(self, out):
+		"""Write the table in compact binary format (little endian):
+		magic "LTGT", version (u8, 2), k (u32), then the symbol count
+		(u32) followed by the symbols (u16 size + UTF-8), the
+		non-terminal count (u32) followed by their symbol indexes (u32),
+		the lookahead count (u32) followed by the lookaheads (u32 length
+		+ u32 symbol indexes) and the entry count (u32) followed by the
+		entries (u32 non-terminal index, u32 lookahead index, u32 rule)."""
+		syms = list(self.nts)
+		sym_map = { X: i for (i, X) in enumerate(syms) }
+		for la in self.las:
+			for a in la:
+				if a not in sym_map:
+					sym_map[a] = len(syms)
+					syms.append(a)
+		out.write(b"LTGT" + struct.pack("<BI", 2, self.k))
+		out.write(struct.pack("<I", len(syms)))
+		for sym in syms:
+			b = sym.encode("utf-8")
+			out.write(struct.pack("<H", len(b)) + b)
+		out.write(struct.pack("<I", len(self.nts)))
+		out.write(to_u32(range(len(self.nts))))
+		out.write(struct.pack("<I", len(self.las)))
+		for la in self.las:
+			out.write(to_u32([len(la)] + [sym_map[a] for a in la]))
+		es = [x for e in self.entries() for x in e]
+		out.write(struct.pack("<I", len(es) // 3))
+		out.write(to_u32(es))
+
+	def save(self, path, format = None):
+		"""Save the table to the file at path using the given format
+		(an extension of FORMATS) or the format corresponding to the
+		file extension (default to text)."""
+		if format == None:
+			format = os.path.splitext(path)[1]
+		(fun, binary) = FORMATS.get(format, FORMATS[".txt"])
+		if binary:
+			out = open(path, "wb", buffering = BUFFER_SIZE)
+		else:
+			out = open(path, "w", buffering = BUFFER_SIZE)
+		with out:
+			fun(self, out)
+
+	def parse(self, word, sync = None):
+		return Parser(self, word, sync)
+
+
+def to_u32(l):
+	"""Convert the list of integers into little-endian unsigned 32-bit bytes."""
+	l = list(l)
+	return struct.pack("<%dI" % len(l), *l)
+
+
+# table formats by file extension: (writing function, binary)
+FORMATS = {
+	".txt": (Table.write, False),
+	".csv": (Table.write_to_csv, False),
+	".json": (Table.write_to_json, False),
+	".coo": (Table.write_to_coo, False),
+	".bin": (Table.write_to_binary, True)
+}
+
+# size of output buffers
+BUFFER_SIZE = 1 << 16
+
+
+# LinearTable class
+class LinearTable:
+	"""LL(k) table built from the result of analyze_linear(). The row of
+	a non-terminal tests in turn the linear lookahead of each of its
+	rules or, if the non-terminal needed the exact analysis, looks up
+	the lookahead words."""
+
+	def __init__(self, k, G, las):
+		self.k = k
+		self.G = G
+		self.rows = { X: [] for X in G.names }
+		self.exact = {}
+		for (n, X, s, la) in las:
+			if isinstance(la, LinearSet):
+				self.rows[X].append((n, la))
+			else:
+				m = self.exact.setdefault(X, {})
+				for w in la:
+					m[w] = n
+
+	def at(self, X, p):
+		"""Give the rule to expand for non-terminal X and lookahead p.
+		Raise KeyError if there is no rule."""
+		if X in self.exact:
+			return self.exact[X][p]
+		for (n, la) in self.rows[X]:
+			if p in la:
+				return n
+		raise KeyError(p)
+
+	def depth(self, X):
+		return self.k
+
+	def get_non_terminals(self):
+		return list(self.rows.keys())
+
+	def lookaheads(self, X):
+		"""Get the lookaheads of the row of X."""
+		if X in self.exact:
+			return list(self.exact[X].keys())
+		return [la for (n, la) in self.rows[X]]
+
+	def write(self, out):
+		"""Write the table in human readable way."""
+		for X in self.rows:
+			if X in self.exact:
+				out.writelines("%s\t%s\t(%d)\n" % (X, w, n)
+					for (w, n) in self.exact[X].items())
+			else:
+				out.writelines("%s\t%s\t(%d)\n" % (X, la, n)
+					for (n, la) in self.rows[X])
+
+	def save(self, path, format = None):
+		"""Save the table to the file at path (only in text format)."""
+		with open(path, "w", buffering = BUFFER_SIZE) as out:
+			self.write(out)
+
+	def parse(self, word, sync = None):
+		return Parser(self, word, sync)
+
+
+# LazyTable class
+class LazyTable:
+	"""LL(k) table whose rows are computed when the parser needs them:
+	the lookaheads of the rules of a non-terminal are only computed
+	(and checked for conflicts) the first time the non-terminal has to
+	be expanded. ConflictError is raised when the rules of the row
+	conflict."""
+
+	def __init__(self, k, G):
+		self.k = k
+		self.G = G
+		self.rows = {}
+
+	def row(self, X):
+		"""Get the row of X as a dictionary from lookahead to rule."""
+		r = self.rows.get(X)
+		if r == None:
+			rs = rule_lookaheads(self.k, X, self.G)
+			cs = conflicts(rs)
+			if cs != []:
+				raise ConflictError(X, conflicts_to_str(self.k, rs, cs))
+			r = {}
+			for (n, Y, s, la) in rs:
+				for w in la:
+					r[w] = n
+			self.rows[X] = r
+		return r
+
+	def at(self, X, p):
+		"""Give the rule to expand for non-terminal X and lookahead p.
+		Raise KeyError if there is no rule."""
+		return self.row(X)[p]
+
+	def depth(self, X):
+		return self.k
+
+	def get_non_terminals(self):
+		return list(self.rows.keys())
+
+	def lookaheads(self, X):
+		"""Get the lookaheads of the row of X."""
+		return list(self.row(X).keys())
+
+	def write(self, out):
+		"""Write the computed rows in human readable way."""
+		for (X, r) in self.rows.items():
+			out.writelines("%s\t%s\t(%d)\n" % (X, w, n) for (w, n) in r.items())
+
+	def save(self, path, format = None):
+		"""Save the computed rows to the file at path (only in text
+		format)."""
+		with open(path, "w", buffering = BUFFER_SIZE) as out:
+			self.write(out)
+
+	def parse(self, word, sync = None):
+		return Parser(self, word, sync)
 
 
 ## Observer class
@@ -218,15 +798,21 @@ class DisplayObserver(Observer):
 			.format("Stack", "Word", "Action", size=self.size))
 		output("-"*self.size + " " + "-"*self.size + " " + "-"*12)
 
-	def on_next(self, parser):
-		if parser.action == ERROR:
-			msg = "error"
-		elif parser.action == ACCEPT:
-			msg = "accept"
-		elif type(parser.action) == int:
-			msg = "expand (%d)" % parser.action
+	def message(self, action):
+		"""Get the text displayed for the given action."""
+		if action == ERROR:
+			return "error"
+		elif action == ACCEPT:
+			return "accept"
+		elif action == RECOVER:
+			return "recover"
+		elif type(action) == int:
+			return "expand (%d)" % action
 		else:
-			msg = "pop %s" % parser.action
+			return "pop %s" % action
+
+	def on_next(self, parser):
+		msg = self.message(parser.action)
 		output("{0:{size}} {1:{size}} {2:{size}}" \
 			.format(str(self.ps), str(self.pw), msg, size=self.size))
 		self.ps = parser.stack
@@ -242,16 +828,17 @@ class ParseTreeObserver(Observer):
 	def on_start(self, parser):
 		self.root = ParseTree(parser.G.get_top())
 		self.stack = [ParseTree("$")] * parser.get_k() + [self.root]
-		print(self.stack)
 
 	def on_next(self, parser):
 		if type(parser.action) == str:
 			self.stack.pop()
+		elif parser.action == RECOVER:
+			del self.stack[len(parser.stack):]
 		elif parser.action >= 0:
 			parent = self.stack[-1]
 			parent.rule = parser.action
 			self.stack.pop()
-			s = parser.get_grammar().get_rules()[parser.action][1]
+			s = parser.get_grammar().get_rules()[parser.action].w
 			for i in range(len(s)-1, -1, -1):
 				node = ParseTree(s[i])
 				self.stack.append(node)
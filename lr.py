@@ -0,0 +1,587 @@
+#
+#	Language Theory GENerator
+#	Copyright (C) 2021  Hugues Cassé <hug.casse@gmail.com>
+#
+#	This program is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	This program is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+"""LALR(1) parser generator and analyzer.
+
+The LR(0) automaton is built first and the LALR(1) lookaheads of its
+reductions are then computed with the relations of DeRemer and Pennello
+(reads, includes and lookback) instead of merging LR(1) states. Sets of
+tokens are represented as integers used as bit sets."""
+
+from common import *
+from lang import *
+from ll import ACCEPT, ERROR, Observer, BUFFER_SIZE
+import ll
+
+# end of word marker
+END = "$"
+
+
+def digraph(R, F):
+	"""Compute, for each node x, F'(x) = F(x) | F'(y) for all y such
+	that x R y. Nodes are integers, R[x] is the list of successors of x
+	and F[x] is a bit set. The traversal is iterative (Tarjan's strongly
+	connected components) so that long chains do not exhaust the Python
+	stack. Return the list of F'(x)."""
+	n = len(F)
+	F = list(F)
+	N = [0] * n
+	done = n + 1
+	stack = []
+	for x0 in range(0, n):
+		if N[x0] != 0:
+			continue
+		stack.append(x0)
+		N[x0] = len(stack)
+		todo = [(x0, 0, len(stack))]
+		while todo != []:
+			(x, i, d) = todo[-1]
+			if i < len(R[x]):
+				todo[-1] = (x, i + 1, d)
+				y = R[x][i]
+				if N[y] == 0:
+					stack.append(y)
+					N[y] = len(stack)
+					todo.append((y, 0, len(stack)))
+				else:
+					N[x] = min(N[x], N[y])
+					F[x] |= F[y]
+			else:
+				todo.pop()
+				if N[x] == d:
+					while True:
+						y = stack.pop()
+						N[y] = done
+						F[y] = F[x]
+						if y == x:
+							break
+				if todo != []:
+					p = todo[-1][0]
+					N[p] = min(N[p], N[x])
+					F[p] |= F[x]
+	return F
+
+
+def bits_to_list(b, syms):
+	"""Convert the bit set b into the list of corresponding symbols."""
+	r = []
+	i = 0
+	while b != 0:
+		if b & 1:
+			r.append(syms[i])
+		b = b >> 1
+		i = i + 1
+	return r
+
+
+# Automaton class
+class Automaton:
+	"""LR(0) automaton of grammar G with the LALR(1) lookaheads of its
+	reductions. An item (rule, dot) is represented by the integer
+	offset of the rule plus the dot position. After construction:
+	  * states -- list of kernels (tuples of items),
+	  * trans -- for each state, map of symbols to the next state,
+	  * reduces -- for each state, list of (rule, lookahead bit set),
+	  * tokens -- list of tokens ending with END (the bit i of a
+	    lookahead set stands for tokens[i])."""
+
+	def __init__(self, G):
+		self.G = G
+		rules = G.get_rules()
+		self.nts = set(G.names)
+		self.tokens = sorted(G.tokens) + [END]
+		self.tok_map = { a: i for (i, a) in enumerate(self.tokens) }
+
+		# items
+		self.offsets = []
+		self.item_rule = []
+		self.item_next = []
+		for (n, rule) in enumerate(rules):
+			self.offsets.append(len(self.item_rule))
+			for i in range(0, len(rule.w) + 1):
+				self.item_rule.append(n)
+				self.item_next.append(rule.w[i] if i < len(rule.w) else None)
+		self.by_nt = { X: [] for X in G.names }
+		for (n, rule) in enumerate(rules):
+			self.by_nt[rule.X].append(n)
+
+		self.compute_nullable()
+		self.compute_states()
+		self.compute_lookaheads()
+
+	def compute_nullable(self):
+		"""Compute the set of nullable non-terminals."""
+		self.nullable = set()
+		changed = True
+		while changed:
+			changed = False
+			for rule in self.G.get_rules():
+				if rule.X not in self.nullable \
+				and all(a in self.nullable for a in rule.w):
+					self.nullable.add(rule.X)
+					changed = True
+
+	def compute_states(self):
+		"""Build the LR(0) automaton."""
+
+		# items starting the closure of each non-terminal
+		starts = {}
+		for X in self.G.names:
+			todo = [X]
+			seen = { X }
+			items = []
+			while todo != []:
+				Y = todo.pop()
+				for n in self.by_nt[Y]:
+					i = self.offsets[n]
+					items.append(i)
+					Z = self.item_next[i]
+					if Z in self.nts and Z not in seen:
+						seen.add(Z)
+						todo.append(Z)
+			starts[X] = items
+
+		# build the states: the successors of the closure items only
+		# depend on the non-terminals following the dot in the kernel
+		self.states = [(self.offsets[0],)]
+		self.trans = []
+		self.completed = []
+		state_map = { self.states[0]: 0 }
+		def get_state(items):
+			s = state_map.get(items)
+			if s == None:
+				s = len(self.states)
+				state_map[items] = s
+				self.states.append(items)
+			return s
+		closures = {}
+		i = 0
+		while i < len(self.states):
+			kernel = self.states[i]
+			key = frozenset(self.item_next[item] for item in kernel
+				if self.item_next[item] in self.nts)
+			closure = closures.get(key)
+			if closure == None:
+				seen = set()
+				succs = ({}, [])
+				for X in key:
+					for item in starts[X]:
+						if item not in seen:
+							seen.add(item)
+							self.advance(item, succs)
+				# (items, resolved states, completed, unresolved symbols)
+				closure = ({ a: tuple(sorted(l)) for (a, l) in succs[0].items() },
+					{}, succs[1], set(succs[0]))
+				closures[key] = closure
+			own = ({}, list(closure[2]))
+			for item in kernel:
+				self.advance(item, own)
+			trans = dict(closure[1])
+			for a in [a for a in closure[3] if a not in own[0]]:
+				trans[a] = closure[1][a] = get_state(closure[0][a])
+				closure[3].remove(a)
+			for (a, l) in own[0].items():
+				trans[a] = get_state(tuple(sorted(l + list(closure[0].get(a, ())))))
+			self.trans.append(trans)
+			self.completed.append(own[1])
+			i = i + 1
+
+	def advance(self, item, succs):
+		"""Record in succs = (map of symbols to items, list of completed
+		rules) the effect of moving the dot of item."""
+		a = self.item_next[item]
+		if a == None:
+			succs[1].append(self.item_rule[item])
+		else:
+			succs[0].setdefault(a, []).append(item + 1)
+
+	def compute_lookaheads(self):
+		"""Compute the LALR(1) lookaheads (DeRemer and Pennello)."""
+		rules = self.G.get_rules()
+
+		# non-terminal transitions
+		nt_trans = []
+		nt_map = {}
+		self.sources = {}
+		for (p, trans) in enumerate(self.trans):
+			for (A, q) in trans.items():
+				if A in self.nts:
+					nt_map[(p, A)] = len(nt_trans)
+					nt_trans.append((p, A))
+					self.sources.setdefault(A, []).append(p)
+
+		# direct reads and reads relation
+		DR = []
+		reads = []
+		start = rules[0].w[0]
+		for (p, A) in nt_trans:
+			r = self.trans[p][A]
+			b = 0
+			rs = []
+			for (a, q) in self.trans[r].items():
+				if a in self.nts:
+					if a in self.nullable:
+						rs.append(nt_map[(r, a)])
+				else:
+					b |= 1 << self.tok_map[a]
+			if p == 0 and A == start:
+				b |= 1 << self.tok_map[END]
+			DR.append(b)
+			reads.append(rs)
+		Read = digraph(reads, DR)
+
+		# includes and lookback relations
+		includes = [[] for t in nt_trans]
+		lookback = {}
+		trans = self.trans
+		for (n, rule) in enumerate(rules):
+			w = tuple(rule.w)
+			i = len(w)
+			while i > 0 and w[i - 1] in self.nullable:
+				i = i - 1
+			tail = [(j, w[j]) for j in range(max(i - 1, 0), len(w)) if w[j] in self.nts]
+			for p in self.sources.get(rule.X, ()):
+				t = nt_map[(p, rule.X)]
+				q = p
+				for a in w[:max(i - 1, 0)]:
+					q = trans[q][a]
+				j = max(i - 1, 0)
+				for (k, A) in tail:
+					while j < k:
+						q = trans[q][w[j]]
+						j = j + 1
+					includes[nt_map[(q, A)]].append(t)
+				for a in w[j:]:
+					q = trans[q][a]
+				lookback.setdefault((q, n), []).append(t)
+		Follow = digraph(includes, Read)
+
+		# lookaheads of the reductions
+		self.reduces = []
+		for (q, completed) in enumerate(self.completed):
+			rs = []
+			for n in completed:
+				if n == 0:
+					b = 1 << self.tok_map[END]
+				else:
+					b = 0
+					for t in lookback.get((q, n), []):
+						b |= Follow[t]
+				rs.append((n, b))
+			self.reduces.append(rs)
+
+	def lookahead(self, q, n):
+		"""Get the set of tokens allowing reduction of rule n in state q."""
+		for (m, b) in self.reduces[q]:
+			if m == n:
+				return set(bits_to_list(b, self.tokens))
+		return set()
+
+	def conflicts(self):
+		"""Get the list of conflicts as (state, token, actions) where
+		actions is a list of rule numbers (reductions) possibly
+		starting with None (shift)."""
+		r = []
+		for (q, rs) in enumerate(self.reduces):
+			seen = 0
+			shared = 0
+			for (n, b) in rs:
+				shared |= seen & b
+				seen |= b
+			for (a, s) in self.trans[q].items():
+				if a not in self.nts and seen & (1 << self.tok_map[a]):
+					shared |= 1 << self.tok_map[a]
+			for a in bits_to_list(shared, self.tokens):
+				i = 1 << self.tok_map[a]
+				acts = [n for (n, b) in rs if b & i]
+				if a in self.trans[q]:
+					acts = [None] + acts
+				r.append((q, a, acts))
+		return r
+
+	def write(self, out):
+		"""Write the automaton in human-readable way."""
+		rules = self.G.get_rules()
+		for (q, kernel) in enumerate(self.states):
+			out.write("state %d\n" % q)
+			for item in kernel:
+				rule = rules[self.item_rule[item]]
+				d = item - self.offsets[self.item_rule[item]]
+				out.write("\t%s -> %s\n" % (rule.X,
+					" ".join(list(rule.w[:d]) + ["."] + list(rule.w[d:]))))
+			for (a, s) in self.trans[q].items():
+				out.write("\t%s\tgoto %d\n" % (a, s))
+			for (n, b) in self.reduces[q]:
+				out.write("\t{ %s }\treduce (%d)\n"
+					% (", ".join(bits_to_list(b, self.tokens)), n))
+
+
+def conflict_to_str(c):
+	(q, a, acts) = c
+	return "state %d, %s: %s" % (q, a, ", ".join(
+		"shift" if n == None else "reduce (%d)" % n for n in acts))
+
+
+def analyze(G):
+	"""Perform the LALR(1) analysis of G, display the conflicts and
+	return the automaton or None if the grammar is not LALR(1)."""
+	A = Automaton(G)
+	cs = A.conflicts()
+	for c in cs:
+		output("conflict in %s" % conflict_to_str(c))
+	if cs != []:
+		return None
+	else:
+		return A
+
+
+# maximal number of holes tried to pack a row
+MAX_TRIES = 64
+
+def pack(rows, width):
+	"""Pack the sparse rows (maps from column indexes, less than width,
+	to values) in a single vector (row displacement). Return (base,
+	check, values): the value of column j in row i is values[base[i] + j]
+	if check[base[i] + j] == j. Identical rows share the same base and
+	the bases of different rows are different."""
+	base = [0] * len(rows)
+	check = []
+	values = []
+	used = bytearray()
+	bases = set()
+	known = {}
+	first = 0
+	order = sorted(range(0, len(rows)), key = lambda i: -len(rows[i]))
+	for i in order:
+		key = tuple(sorted(rows[i].items()))
+		b = known.get(key)
+		if b == None:
+			if key == ():
+				b = -width
+			else:
+				cols = [j for (j, v) in key]
+				first = used.find(0, first)
+				if first < 0:
+					first = len(used)
+				pos = first
+				tries = 0
+				while True:
+					b = pos - cols[0]
+					if b not in bases and all(b + j >= len(used) or not used[b + j]
+					for j in cols):
+						break
+					tries = tries + 1
+					p = used.find(0, pos + 1)
+					if p < 0 or tries >= MAX_TRIES:
+						p = max(pos + 1, len(used))
+					pos = p
+				top = b + cols[-1] + 1
+				if top > len(used):
+					used.extend(bytes(top - len(used)))
+					check.extend([-1] * (top - len(check)))
+					values.extend([0] * (top - len(values)))
+				for (j, v) in key:
+					used[b + j] = 1
+					check[b + j] = j
+					values[b + j] = v
+			bases.add(b)
+			known[key] = b
+		base[i] = b
+	return (base, check, values)
+
+
+# Table class
+class Table:
+	"""Compact LALR(1) table built from an automaton without conflict.
+	Actions are encoded as integers: 2*s to shift to state s and
+	2*n+1 to reduce rule n. Each state reduces by default with its
+	most frequent reduction, each non-terminal goes by default to its
+	most frequent target state and the remaining actions and gotos are
+	packed by row displacement (see pack())."""
+
+	def __init__(self, A):
+		self.A = A
+		self.G = A.G
+		self.k = 1
+		self.tok_map = A.tok_map
+		self.nt_map = { X: i for (i, X) in enumerate(self.G.names) }
+
+		actions = []
+		gotos = [{} for X in self.G.names]
+		self.defaults = []
+		for (q, trans) in enumerate(A.trans):
+			row = {}
+			for (a, s) in trans.items():
+				if a in A.nts:
+					gotos[self.nt_map[a]][q] = s
+				else:
+					row[self.tok_map[a]] = 2 * s
+			best = None
+			count = 0
+			for (n, b) in A.reduces[q]:
+				ts = bits_to_list(b, A.tokens)
+				if n != 0 and len(ts) > count:
+					(best, count) = (n, len(ts))
+				for a in ts:
+					row[self.tok_map[a]] = 2 * n + 1
+			if best != None:
+				self.defaults.append(2 * best + 1)
+				row = { j: v for (j, v) in row.items() if v != 2 * best + 1 }
+			else:
+				self.defaults.append(None)
+			actions.append(row)
+		(self.abase, self.acheck, self.avalues) = pack(actions, len(A.tokens))
+		self.gdefaults = []
+		for (i, col) in enumerate(gotos):
+			counts = {}
+			for s in col.values():
+				counts[s] = counts.get(s, 0) + 1
+			d = max(counts, key = counts.get) if counts else None
+			self.gdefaults.append(d)
+			gotos[i] = { q: s for (q, s) in col.items() if s != d }
+		(self.gbase, self.gcheck, self.gvalues) = pack(gotos, len(A.states))
+
+	def action(self, q, a):
+		"""Get the action for state q and token a or None for an error."""
+		j = self.tok_map.get(a)
+		if j != None:
+			i = self.abase[q] + j
+			if 0 <= i < len(self.acheck) and self.acheck[i] == j:
+				return self.avalues[i]
+		return self.defaults[q]
+
+	def goto(self, q, X):
+		"""Get the state reached from state q with non-terminal X."""
+		X = self.nt_map[X]
+		i = self.gbase[X] + q
+		if 0 <= i < len(self.gcheck) and self.gcheck[i] == q:
+			return self.gvalues[i]
+		return self.gdefaults[X]
+
+	def write(self, out):
+		"""Write the table in human readable way: one line per state
+		with its default reduction (or ERR), its actions and its gotos."""
+		for q in range(0, len(self.A.states)):
+			d = self.defaults[q]
+			acts = []
+			for a in self.A.tokens:
+				v = self.action(q, a)
+				if v != None and v != d:
+					acts.append("%s:%s%d" % (a, "r" if v & 1 else "s", v >> 1))
+			acts += ["%s:%d" % (X, s) for (X, s) in self.A.trans[q].items()
+				if X in self.A.nts]
+			out.write("%d\t%s\t%s\n" % (q,
+				"ERR" if d == None else "r%d" % (d >> 1), " ".join(acts)))
+
+	def save(self, path, format = None):
+		"""Save the table as text to the file at path."""
+		with open(path, "w", buffering = BUFFER_SIZE) as out:
+			self.write(out)
+
+	def parse(self, word):
+		return Parser(self, word)
+
+
+class Parser:
+	"""Shift-reduce parser driven by an LALR(1) table. As for the LL
+	parser, the analysis is performed along the calls to next and its
+	state can be polled from stack (symbols), word and action. Action
+	takes the last reduced rule number, the shifted token or special
+	ERROR or ACCEPT."""
+
+	def __init__(self, table, word):
+		self.G = table.G
+		self.k = 1
+		self.table = table
+		self.word = word + Word(END)
+		self.stack = Word(END)
+		self.states = [0]
+		self.action = 0
+
+	def get_grammar(self):
+		return self.G
+
+	def get_k(self):
+		return self.k
+
+	def is_ended(self):
+		return self.action in { ERROR, ACCEPT }
+
+	def next(self):
+		"""Go to the next step."""
+		if self.is_ended():
+			return
+		a = self.table.action(self.states[-1], self.word[0])
+		if a == None:
+			self.action = ERROR
+		elif a & 1 == 0:
+			self.action = self.word[0]
+			self.states.append(a >> 1)
+			self.stack = self.stack + self.word[0]
+			self.word = self.word[1:]
+		elif a >> 1 == 0:
+			self.action = ACCEPT if self.word[0] == END else ERROR
+		else:
+			self.action = a >> 1
+			rule = self.G.get_rules()[self.action]
+			n = len(rule.w)
+			if n != 0:
+				del self.states[-n:]
+				self.stack = self.stack[:-n]
+			self.states.append(self.table.goto(self.states[-1], rule.X))
+			self.stack = self.stack + rule.X
+
+
+class DisplayObserver(ll.DisplayObserver):
+	"""Observer displaying the LR analysis."""
+
+	def message(self, action):
+		if type(action) == int and action >= 0:
+			return "reduce (%d)" % action
+		elif type(action) == str:
+			return "shift %s" % action
+		else:
+			return ll.DisplayObserver.message(self, action)
+
+
+class ParseTreeObserver(Observer):
+	"""Observer building the parse tree bottom-up."""
+
+	def get_root(self):
+		return self.root
+
+	def on_start(self, parser):
+		self.root = None
+		self.nodes = []
+
+	def on_next(self, parser):
+		if type(parser.action) == str:
+			self.nodes.append(ParseTree(parser.action))
+		elif parser.action >= 0:
+			rule = parser.get_grammar().get_rules()[parser.action]
+			node = ParseTree(rule.X)
+			node.rule = parser.action
+			n = len(rule.w)
+			if n != 0:
+				node.children = self.nodes[-n:]
+				del self.nodes[-n:]
+			self.nodes.append(node)
+		elif parser.action == ACCEPT:
+			self.root = ParseTree(parser.get_grammar().get_top())
+			self.root.rule = 0
+			self.root.children = self.nodes
@@ -17,13 +17,26 @@
 #	along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 import argparse
+import itertools
 import os.path
 import sys
-import ui
 
 from common import *
 from lang import *
+import lang
+import ambiguity
+import earley
+import gen
+import lexer
 import ll
+import lr
+import transform
+
+# default threshold of set size warnings
+WARN_WORDS = 100000
+
+# number of words parsed together by --batch
+BATCH_SIZE = 4096
 
 
 # main command
@@ -48,35 +61,103 @@ parser.add_argument("--lookahead", action="store_true",
 	help="Compute the lookahead.")
 parser.add_argument("--ll", action="store_true",
 	help="Perform LL(k) analysis.")
+parser.add_argument("--lalr", action="store_true",
+	help="Perform LALR(1) analysis.")
+parser.add_argument("--k-range", type=str, default=None,
+	help="Look for the smallest k in the range MIN..MAX (or 1..MAX) such that the grammar is LL(k).")
+parser.add_argument("--linear", action="store_true",
+	help="Use linear-approximate lookaheads (one token set per position) for --lookahead and --ll.")
+parser.add_argument("--adaptive", action="store_true",
+	help="With --ll, use for each non-terminal the minimal depth up to --k.")
+parser.add_argument("--lazy", action="store_true",
+	help="With --ll, compute the rows of the table only when the parsed words need them.")
+parser.add_argument("--estimate", action="store_true",
+	help="Display upper bounds of the sizes of the first and follow sets.")
+parser.add_argument("--max-words", type=int, default=None,
+	help="Abort if a first or follow set gets more than the given number of words.")
+parser.add_argument("--max-memory", type=int, default=None,
+	help="Abort if the first and follow computations use more than the given memory in MB.")
+parser.add_argument("--max-time", type=float, default=None,
+	help="Abort if the first and follow computations take more than the given time in seconds.")
+parser.add_argument("--transform", action="store_true",
+	help="Remove the left recursion and left-factor the grammar before the analyses (parse trees are given in the original grammar).")
+parser.add_argument("--enumerate", type=int, default=None, metavar="N",
+	help="Display the N first words of the language by increasing length (0 for no limit).")
+parser.add_argument("--length", type=int, default=None,
+	help="Maximal length of the words displayed by --enumerate.")
+parser.add_argument("--random", type=int, default=None, metavar="N",
+	help="Generate N random words of the language (0 for no limit).")
+parser.add_argument("--coverage", action="store_true",
+	help="Generate random words until all the rules of the grammar are used.")
+parser.add_argument("--lengths", type=str, default="0..20",
+	help="Length distribution of the random words as comma-separated L or MIN..MAX items with an optional :WEIGHT (default to 0..20).")
+parser.add_argument("--seed", type=int, default=None,
+	help="Seed of the random word generation.")
+parser.add_argument("--sentences", type=str, default=None, metavar="PATH",
+	help="Output the random words to the file at PATH.")
+parser.add_argument("--ambiguity", type=int, default=None, metavar="L",
+	help="Look for the shortest ambiguous words of length at most L.")
 parser.add_argument("--gen-csv", action="store_true",
 	help="Generate the analysis table in CSV format.")
 parser.add_argument("--print", action="store_true",
 	help="Print the grammar.")
 parser.add_argument("--output", "-o", type=str, nargs="?", default=None,  const="",
-	help="Generate the analysis table in CSV format.")
+	help="Output the analysis table to a file, the format depending on the extension (.txt, .csv, .json, .coo, .bin).")
 parser.add_argument("--table", action="store_true",
 	help="Generate the table for the used analysis.")
 parser.add_argument("--words", "-w", type=str, nargs="*", default=[],
 	help="Parse the given word after the analysis.")
+parser.add_argument("--files", "-f", type=str, nargs="*", default=[],
+	help="Parse the given files after the analysis (tokens are produced by the lexer of the grammar).")
+parser.add_argument("--batch", type=str, default=None, metavar="PATH",
+	help="Parse the words of the file at PATH (one per line) with the vectorized batch parser (requires NumPy).")
+parser.add_argument("--recover", action="store_true",
+	help="With --ll, recover from the syntax errors to report all the errors of the parsed inputs.")
+parser.add_argument("--general", action="store_true",
+	help="Parse the words given by --words with a general (Earley) parser working with any grammar.")
 parser.add_argument("--tree", action="store_true",
 	help="Display the parse tree.")
 parser.add_argument("--dot", action="store_true",
 	help="Display the parse tree as .dot format.")
 parser.add_argument("--ui", "-u", action="store_true",
 	help="Run the user interface.")
+parser.add_argument("--serve", action="store_true",
+	help="Run the JSON/HTTP analysis service.")
 parser.add_argument("--port", type=int, default=4444,
 	help="Select the port for serving or running the UI.")
+parser.add_argument("--workers", type=int, default=2,
+	help="Number of worker processes performing the UI or service analyses (default to 2).")
+parser.add_argument("--timeout", type=float, default=30,
+	help="Time budget in seconds of an UI or service analysis (default to 30).")
+parser.add_argument("--memory", type=int, default=512,
+	help="Memory budget in MB of an UI or service analysis (default to 512).")
 args = parser.parse_args()
 
 
 # UI management
 if args.ui:
+	import ui
 	no_action = False
-	ui.run(args.port)
+	ui.run(args.port, args.workers, args.timeout, args.memory << 20)
+	sys.exit(0)
+
+# service management
+if args.serve:
+	import service
+	service.run(args.port, args.workers, args.timeout, args.memory << 20)
 	sys.exit(0)
 
 # get the grammar
 G = Grammar(args.grammar)
+LEXER = lexer.for_grammar(G)
+T = None
+if args.transform:
+	T = transform.Transformation(G).remove_left_recursion().left_factor()
+	G = T.get_grammar()
+	rec = transform.left_recursive(G)
+	if rec != []:
+		fatal("%s: left recursion through nullable symbols can not be removed: %s."
+			% (args.grammar, ", ".join(rec)))
 
 # prepare the arguments
 no_action = True
@@ -86,6 +167,33 @@ else:
 	names = G.names
 exit_code = 0
 
+# resource management
+if args.max_words != None or args.max_memory != None or args.max_time != None:
+	if args.max_memory != None:
+		args.max_memory = args.max_memory << 20
+	lang.GOVERNOR = Governor(args.max_words, args.max_memory, args.max_time, fatal)
+if args.estimate or args.first or args.follow or args.lookahead or args.ll \
+or args.k_range != None:
+	k = args.k
+	if args.k_range != None:
+		try:
+			k = int(args.k_range.split("..")[-1])
+		except ValueError:
+			pass
+	(fb, fob) = estimate(k, G)
+	if args.estimate:
+		no_action = False
+		for X in names:
+			output("|first%d(%s)| <= %d, |follow%d(%s)| <= %d" \
+				% (k, X, fb[X], k, X, fob[X]))
+	else:
+		warn = args.max_words if args.max_words != None else WARN_WORDS
+		for X in names:
+			if fb[X] > warn:
+				info("WARNING: first%d(%s) may contain up to %d words." % (k, X, fb[X]))
+			if fob[X] > warn:
+				info("WARNING: follow%d(%s) may contain up to %d words." % (k, X, fob[X]))
+
 # msic. calculations
 if args.first:
 	no_action = False
@@ -99,96 +207,346 @@ if args.follow:
 		output("follow%d(%s) = %s" % (args.k, n, word_set_to_str(f)))
 if args.lookahead:
 	no_action = False
+	if args.linear:
+		L = LinearFirstFollow(args.k, G)
 	for rule in G.get_rules():
 		if rule.X in names:
-			f = ll.lookahead(args.k, rule.X, rule.w, G)
-		output("%d-lookahead(%s) = %s" % \
-			(args.k, rule, word_set_to_str(f)))
+			if args.linear:
+				f = L.lookahead(rule.X, rule.w)
+			else:
+				f = ll.lookahead(args.k, rule.X, rule.w, G)
+			output("%d-lookahead(%s) = %s" % \
+				(args.k, rule, ll.lookahead_to_str(f)))
+
+# enumerate the language
+if args.enumerate != None:
+	no_action = False
+	for w in gen.language(G, args.length, args.enumerate if args.enumerate > 0 else None):
+		output(w)
+
+# generate random words
+if args.random != None or args.coverage:
+	no_action = False
+	try:
+		lengths = gen.parse_lengths(args.lengths)
+	except ValueError:
+		fatal("bad length distribution: %s" % args.lengths)
+	R = gen.Generator(G, args.seed)
+	if not any(R.count(G.top, n) > 0 for n in lengths):
+		fatal("no word of the language has a length in %s" % args.lengths)
+	out = sys.stdout if args.sentences == None else open(args.sentences, "w")
+	used = set()
+	if args.coverage:
+		for w in R.cover(lengths, used):
+			out.write("%s\n" % w)
+		for (n, rule) in enumerate(G.get_rules()):
+			if n not in used:
+				info("rule (%d) %s can not be used." % (n, rule))
+	if args.random != None:
+		for w in R.words(lengths, args.random if args.random > 0 else None):
+			out.write("%s\n" % w)
+	if out != sys.stdout:
+		out.close()
+
+# look for ambiguities
+if args.ambiguity != None:
+	no_action = False
+	ws = ambiguity.shortest(G, args.ambiguity)
+	for (w, F) in ws:
+		for l in ambiguity.ambiguity_to_str(w, F):
+			output(l)
+	if ws == []:
+		info("%s: no ambiguous word up to length %d." % (args.grammar, args.ambiguity))
+	else:
+		info("%s is ambiguous." % args.grammar)
 
-# print the grammar
 if args.print:
-	G.print(sys.stdout)
+	no_action = False
+	if T == None:
+		G.print(sys.stdout)
+	else:
+		for (n, rule) in enumerate(G.get_rules()):
+			m = T.origin(n)
+			output("(%d) %s%s" % (n, rule, "" if m == None else "\t<- (%d)" % m))
+
+# parsed inputs
+def inputs():
+	"""Generate the inputs to parse as (name, word or token stream)."""
+	for w in args.words:
+		w = Word(*w.split())
+		yield ("_".join(w), w)
+	for path in args.files:
+		if LEXER == None:
+			fatal("no lexer in %s to parse %s." % (args.grammar, path))
+		try:
+			yield (os.path.splitext(path)[0], LEXER.open(path))
+		except OSError as e:
+			error("cannot open %s: %s" % (path, e))
+
+def syntax_error(w, i = 0):
+	"""Report a syntax error at token i of input w."""
+	if type(w) == Word:
+		if i < len(w):
+			info("%s: syntax error at %s (token %d)." % (w, w[i], i))
+		else:
+			info("%s: syntax error at end." % w)
+	else:
+		w = w[i:]
+		l = w.location()
+		if l == None:
+			error("%s: syntax error at end of file." % w.source.path)
+		else:
+			error("%s:%d:%d: syntax error at \"%s\"."
+				% (w.source.path, l[0], l[1], w.text()))
+
+# parse tree output
+def open_tree(name):
+	"""Open the output of the parse tree of the named input."""
+	if args.output == None:
+		return sys.stdout
+	elif args.output != "":
+		return open(args.output, "w")
+	elif args.dot:
+		return open(name + ".dot", "w")
+	else:
+		return open(name + ".txt", "w")
 
-# LL(k) analysis
-if args.ll:
+def write_tree(name, root):
+	"""Output the parse tree of the named input (in the original grammar)."""
+	if T != None:
+		root = T.restore(root)
+	out = open_tree(name)
+	if args.dot:
+		root.write_dot(out)
+	else:
+		root.write(out)
+	if out != sys.stdout:
+		out.close()
+
+def report_errors(w, errors):
+	"""Report the errors found by a recovering parser in input w."""
+	if type(w) == Word:
+		for e in errors:
+			info("%s: %s." % (w, e))
+	else:
+		locs = lexer.locations(w.source.buf,
+			[e.offset for e in errors if e.offset != None])
+		for e in errors:
+			if e.offset == None:
+				error("%s: syntax error at end of file, expected %s."
+					% (w.source.path, e.expected_to_str()))
+			else:
+				(l, c) = next(locs)
+				error("%s:%d:%d: syntax error at \"%s\", expected %s."
+					% (w.source.path, l, c, e.text, e.expected_to_str()))
+
+# LL(k) or LALR(1) analysis
+if args.ll or args.k_range != None or args.lalr:
 	no_action = False
 
 	# perform the analysis
-	las = ll.analyze(args.k, G)
-	if las == None:
-		fatal("%s is not LL(%d)!" % (args.grammar[0], args.k))
+	depths = None
+	if args.lazy:
+		las = None
+	elif args.lalr:
+		las = lr.analyze(G)
+	elif args.k_range != None:
+		try:
+			if ".." in args.k_range:
+				(kmin, kmax) = [int(x) for x in args.k_range.split("..")]
+			else:
+				(kmin, kmax) = (1, int(args.k_range))
+		except ValueError:
+			fatal("bad k range: %s" % args.k_range)
+		las = None
+		for (k, las, t) in ll.sweep(kmax, G, kmin):
+			output("LL(%d): %s (%.3fs)" % (k, "no" if las == None else "yes", t))
+			if las != None:
+				args.k = k
+		if las == None:
+			args.k = kmax
+	elif args.linear:
+		las = ll.analyze_linear(args.k, G)
+	elif args.adaptive:
+		r = ll.analyze_adaptive(args.k, G)
+		if r == None:
+			las = None
+		else:
+			(las, depths) = r
 	else:
-		info("%s is LL(%d)." % (args.grammar[0], args.k))
+		las = ll.analyze(args.k, G)
+	if args.lalr:
+		kind = "LALR(1)"
+	else:
+		kind = "LL(%d)" % args.k
+	if args.lazy:
+		pass
+	elif las == None:
+		fatal("%s is not %s!" % (args.grammar, kind))
+	else:
+		info("%s is %s." % (args.grammar, kind))
+	if depths != None:
+		for X in G.names:
+			output("k(%s) = %d" % (X, depths[X]))
 	table = None
 
 	# generate the table if needed
-	if args.table or args.gen_csv == None or args.words != []:
-		table = ll.Table(args.k, G, las)
+	export = args.table or args.gen_csv \
+		or (args.output != None and args.words == [] and args.files == [])
+	if export or args.words != [] or args.files != [] or args.batch != None:
+		if args.lazy:
+			table = ll.LazyTable(args.k, G)
+		elif args.lalr:
+			table = lr.Table(las)
+		elif args.linear:
+			table = ll.LinearTable(args.k, G, las)
+		else:
+			table = ll.Table(args.k, G, las, depths)
 
 	# output the results
-	if args.table or args.gen_csv == None:
-		if args.output != None:
-			if args.output != "":
-				path = args.output
-			else:
-				if args.gen_csv:
-					ext = ".csv"
-				else:
-					ext = ".txt"
-				path = os.path.splitext(args.grammar[0])[0] + ext
-			out = open(path, "w")
-		else:
-			out = sys.stdout
+	def export_table():
+		"""Output the table as requested by the options."""
 		if args.gen_csv:
-			table.write_to_csv(out)
+			format = ".csv"
+		else:
+			format = ".txt"
+		path = None
+		if args.output == "":
+			path = os.path.splitext(args.grammar)[0] + format
+		elif args.output != None:
+			path = args.output
+			if os.path.splitext(path)[1] in ll.FORMATS:
+				format = os.path.splitext(path)[1]
+		if (args.linear or args.lazy or args.lalr) and format != ".txt":
+			fatal("linear, lazy and LALR tables can only be output as text.")
+		if path != None:
+			table.save(path, format)
+		elif format == ".txt":
+			table.write(sys.stdout)
 		else:
-			table.write(out)
-		if out != sys.stdout:
-			out.close()
+			ll.FORMATS[format][0](table, sys.stdout)
+	if export and not args.lazy:
+		export_table()
 
 	# word analysis
-	for w in args.words:
+	sync = None
+	if args.recover:
+		if args.lalr:
+			fatal("error recovery is only available for LL(k) parsers.")
+		sync = ll.sync_sets(args.k, G)
+	for (name, w) in inputs():
 
 		# prepare observers
-		observers = [ll.DisplayObserver()]
+		mod = lr if args.lalr else ll
+		observers = []
+		if type(w) == Word:
+			observers.append(mod.DisplayObserver())
 		if args.tree or args.dot:
-			tree = ll.ParseTreeObserver()
+			tree = mod.ParseTreeObserver()
 			observers.append(tree)
 		else:
 			tree = None
 
 		# perform the analysis
-		w = Word(*w.split())
-		parser = table.parse(w)
+		if sync == None:
+			parser = table.parse(w)
+		else:
+			parser = table.parse(w, sync)
 		for o in observers:
 			o.on_start(parser)
-		while not parser.is_ended():
-			parser.next()
-			if parser.action == ll.ERROR:
-				exit_code = 2
-			for o in observers:
-				o.on_next(parser)
+		try:
+			while not parser.is_ended():
+				parser.next()
+				for o in observers:
+					o.on_next(parser)
+		except lexer.LexerError as e:
+			error(str(e))
+			exit_code = 2
+			continue
+		except ll.ConflictError as e:
+			for l in e.lines:
+				output(l)
+			fatal("%s is not %s!" % (args.grammar, kind))
+		if args.recover and parser.errors != []:
+			exit_code = 2
+			report_errors(w, parser.errors)
+		elif parser.action == ll.ERROR:
+			exit_code = 2
+			if type(w) != Word:
+				syntax_error(parser.word)
+		elif type(w) != Word:
+			info("%s: accepted." % w.source.path)
+		if type(w) != Word:
+			w.close()
 
 		# postprocess the observers
-		if tree != None or args.dot:
-			if args.output == None:
-				out = sys.stdout
-			else:
-				if args.output != "":
-					path = args.output
-				else:
-					if args.dot:
-						ext = ".dot"
-					else:
-						ext = ".txt"
-					path = word_to_str(w) + ext
-				out = open(path, "w")
-			if args.dot:
-				tree.get_root().write_dot(out)
-			else:
-				tree.get_root().write(out)
+		if tree != None and tree.get_root() != None:
+			write_tree(name, tree.get_root())
+
+	# batch parsing
+	if args.batch != None:
+		if args.linear or args.lazy or args.lalr:
+			fatal("batch parsing only supports plain LL(k) tables.")
+		try:
+			import batch
+		except ImportError:
+			fatal("batch parsing requires NumPy.")
+		B = batch.BatchParser(table)
+		rejected = 0
+		with open(args.batch) as f:
+			lines = enumerate(f, 1)
+			while True:
+				chunk = list(itertools.islice(lines, BATCH_SIZE))
+				if chunk == []:
+					break
+				ws = [Word() if l.split() == ["ε"] else Word(*l.split()) for (n, l) in chunk]
+				for ((n, l), w, (action, i)) in zip(chunk, ws, B.parse(ws)):
+					if action == ll.ERROR:
+						rejected = rejected + 1
+						if i < len(w):
+							info("%s:%d: syntax error at %s (token %d)." % (args.batch, n, w[i], i))
+						else:
+							info("%s:%d: syntax error at end." % (args.batch, n))
+		if rejected != 0:
+			exit_code = 2
+		info("%s: %d word(s) rejected." % (args.batch, rejected))
+
+	# output the computed rows of a lazy table
+	if export and args.lazy:
+		export_table()
+
+# general parsing
+if args.general:
+	no_action = False
+	P = earley.Earley(G)
+	for (name, w) in inputs():
+		if type(w) == Word:
+			desc = str(w)
+			F = P.parse(w)
+		else:
+			desc = w.source.path
+			try:
+				F = P.parse(Word(*w))
+			except lexer.LexerError as e:
+				error(str(e))
+				exit_code = 2
+				continue
+		if not F.is_accepted():
+			exit_code = 2
+			syntax_error(w, F.error)
+			continue
+		n = F.count()
+		if n == None:
+			info("%s: accepted (infinitely many trees)." % desc)
+		else:
+			info("%s: accepted (%d tree%s)." % (desc, n, "s" if n > 1 else ""))
+		if args.dot and T == None:
+			out = open_tree(name)
+			F.write_dot(out)
 			if out != sys.stdout:
 				out.close()
+		elif args.tree or args.dot:
+			write_tree(name, F.tree())
 
 if no_action:
 	G.print(sys.stdout)
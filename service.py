@@ -0,0 +1,329 @@
+#
+#	Language Theory GENerator
+#	Copyright (C) 2021  Hugues Cassé <hug.casse@gmail.com>
+#
+#	This program is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	This program is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+"""Headless analysis service answering JSON requests over HTTP.
+
+Each request is a POST to /first, /follow, /lookahead, /ll, /table or
+/parse with a JSON object containing:
+  * "grammar" -- text of the grammar (in .gram format),
+  * "k" -- lookahead depth (default to 1),
+  * "names" -- non-terminals to work on (default to all),
+  * "words" -- words to parse (tokens separated by spaces or lists of tokens).
+
+Words are returned as lists of tokens. The analyses run in a pool of
+worker processes while the compiled grammars and tables are kept in LRU
+caches keyed by the hash of the grammar content."""
+
+import asyncio
+import json
+
+import common
+import lang
+import ll
+import worker
+
+# maximal number of words in a first/follow set
+MAX_WORDS = 1000000
+
+# maximal size of a request body
+MAX_BODY = 16 << 20
+
+# HTTP status messages
+STATUS = {
+	200: "OK",
+	400: "Bad Request",
+	404: "Not Found",
+	405: "Method Not Allowed",
+	413: "Payload Too Large",
+	500: "Internal Server Error",
+	503: "Service Unavailable"
+}
+
+
+class ServiceError(Exception):
+	"""Error reported to the client with the given HTTP status."""
+
+	def __init__(self, msg, status = 400):
+		Exception.__init__(self, msg)
+		self.status = status
+
+
+# computations (run in the worker processes)
+def govern():
+	lang.GOVERNOR = lang.Governor(words = MAX_WORDS)
+
+def word_set_to_json(S):
+	return sorted(list(w) for w in S)
+
+def compile_grammar(text):
+	return lang.Grammar("request", text)
+
+def compute_first(k, G, names):
+	return { n: word_set_to_json(lang.first(k, lang.Word(n), G)) for n in names }
+
+def compute_follow(k, G, names):
+	return { n: word_set_to_json(lang.follow(k, n, G)) for n in names }
+
+def compute_lookahead(k, G, names):
+	return [{
+			"rule": n,
+			"X": rule.X,
+			"rhs": list(rule.w),
+			"words": word_set_to_json(ll.lookahead(k, rule.X, rule.w, G))
+		}
+		for (n, rule) in enumerate(G.get_rules()) if rule.X in names]
+
+def compute_analysis(k, G):
+	"""Perform the LL(k) analysis and return (table, conflicts)."""
+	las = []
+	cs = []
+	for X in G.names:
+		rs = ll.rule_lookaheads(k, X, G)
+		las += rs
+		cs += [{ "rules": [i, j], "words": word_set_to_json(I) }
+			for (i, j, I) in ll.conflicts(rs)]
+	if cs != []:
+		return (None, cs)
+	else:
+		return (ll.Table(k, G, las), cs)
+
+def parse_words(table, words):
+	results = []
+	for w in words:
+		parser = table.parse(lang.Word(*w))
+		rules = []
+		while not parser.is_ended():
+			parser.next()
+			if type(parser.action) == int and parser.action >= 0:
+				rules.append(parser.action)
+		results.append({
+			"word": w,
+			"accepted": parser.action == ll.ACCEPT,
+			"rules": rules
+		})
+	return results
+
+
+# Service class
+class Service:
+	"""Service state: the worker pool and the caches."""
+
+	def __init__(self, workers = 2, timeout = 30, memory = 512 << 20,
+	cache = 64):
+		self.pool = worker.Pool(workers, timeout, memory, govern)
+		self.grammars = common.LRUCache(cache)
+		self.analyses = common.LRUCache(cache)
+		self.results = common.LRUCache(cache * 4)
+		self.ops = {
+			"first": self.do_first,
+			"follow": self.do_follow,
+			"lookahead": self.do_lookahead,
+			"ll": self.do_ll,
+			"table": self.do_table,
+			"parse": self.do_parse
+		}
+
+	async def call(self, fun, *args):
+		"""Run fun(*args) in the worker pool."""
+		loop = asyncio.get_running_loop()
+		future = loop.create_future()
+		output = []
+		def end(job):
+			if future.cancelled():
+				return
+			elif job.status == worker.DONE:
+				future.set_result(job.result)
+			else:
+				msgs = output
+				if job.message != None:
+					msgs = msgs + [job.message]
+				if msgs == []:
+					msgs = ["analysis stopped (%s)" % job.status]
+				status = 503 if job.status in { worker.TIMEOUT, worker.MEMORY } else 400
+				future.set_exception(ServiceError("\n".join(msgs), status))
+		self.pool.submit(fun, args, output.append,
+			lambda job: loop.call_soon_threadsafe(end, job))
+		return await future
+
+	async def cached(self, cache, key, fun, *args):
+		"""Get the value for key in the cache or compute it with
+		fun(*args) in the worker pool. Concurrent requests for the same
+		key share the same computation."""
+		task = cache.get(key)
+		if task == None:
+			task = asyncio.ensure_future(self.call(fun, *args))
+			cache.put(key, task)
+		try:
+			return await asyncio.shield(task)
+		except ServiceError:
+			if cache.get(key) is task:
+				cache.remove(key)
+			raise
+
+	async def grammar(self, req):
+		text = req.get("grammar")
+		if text == None:
+			raise ServiceError("no grammar in the request")
+		if type(text) != str:
+			raise ServiceError("grammar must be a string")
+		return await self.cached(self.grammars, common.digest(text),
+			compile_grammar, text)
+
+	async def analysis(self, req):
+		k = get_k(req)
+		G = await self.grammar(req)
+		return await self.cached(self.analyses,
+			common.digest(req["grammar"], k), compute_analysis, k, G)
+
+	async def sets(self, op, fun, req):
+		k = get_k(req)
+		G = await self.grammar(req)
+		names = get_names(req, G)
+		return await self.cached(self.results,
+			common.digest(op, req["grammar"], k, *names), fun, k, G, names)
+
+	async def do_first(self, req):
+		return { "first": await self.sets("first", compute_first, req) }
+
+	async def do_follow(self, req):
+		return { "follow": await self.sets("follow", compute_follow, req) }
+
+	async def do_lookahead(self, req):
+		return { "lookahead": await self.sets("lookahead", compute_lookahead, req) }
+
+	async def do_ll(self, req):
+		(table, cs) = await self.analysis(req)
+		return { "ll": table != None, "conflicts": cs }
+
+	async def do_table(self, req):
+		(table, cs) = await self.analysis(req)
+		if table == None:
+			return { "ll": False, "conflicts": cs }
+		return {
+			"ll": True,
+			"non_terminals": table.get_non_terminals(),
+			"lookaheads": [list(w) for w in table.get_lookaheads()],
+			"rows": table.table
+		}
+
+	async def do_parse(self, req):
+		(table, cs) = await self.analysis(req)
+		if table == None:
+			raise ServiceError("grammar is not LL(%d)" % get_k(req))
+		words = [w.split() if type(w) == str else w
+			for w in req.get("words", [])]
+		return { "results": await self.call(parse_words, table, words) }
+
+	async def process(self, path, body):
+		"""Process a request and return the JSON answer."""
+		op = self.ops.get(path.strip("/"))
+		if op == None:
+			raise ServiceError("unknown service %s" % path, 404)
+		try:
+			req = json.loads(body)
+		except ValueError as e:
+			raise ServiceError("malformed JSON: %s" % e)
+		if type(req) != dict:
+			raise ServiceError("request must be a JSON object")
+		return await op(req)
+
+	async def serve_client(self, reader, writer):
+		try:
+			while True:
+				line = await reader.readline()
+				if not line:
+					break
+				try:
+					(method, path, version) = line.decode("latin-1").split()
+				except ValueError:
+					break
+				headers = {}
+				while True:
+					line = await reader.readline()
+					if line in (b"\r\n", b"\n", b""):
+						break
+					(name, _, value) = line.decode("latin-1").partition(":")
+					headers[name.strip().lower()] = value.strip()
+				body = None
+				try:
+					body = await reader.readexactly(get_size(headers))
+					if method != "POST":
+						raise ServiceError("only POST is supported", 405)
+					status = 200
+					answer = await self.process(path, body)
+				except ServiceError as e:
+					status = e.status
+					answer = { "error": str(e) }
+				except Exception as e:
+					status = 500
+					answer = { "error": "%s: %s" % (type(e).__name__, e) }
+				data = json.dumps(answer).encode("utf-8")
+				writer.write(("HTTP/1.1 %d %s\r\n"
+					"Content-Type: application/json\r\n"
+					"Content-Length: %d\r\n\r\n" % (status, STATUS[status], len(data)))
+					.encode("latin-1") + data)
+				await writer.drain()
+				if body == None or headers.get("connection", "").lower() == "close":
+					break
+		except (ConnectionError, asyncio.IncompleteReadError):
+			pass
+		finally:
+			writer.close()
+
+	async def serve(self, port, host = "localhost"):
+		server = await asyncio.start_server(self.serve_client, host, port)
+		async with server:
+			await server.serve_forever()
+
+
+def get_size(headers):
+	"""Get the size of the request body from its headers."""
+	text = headers.get("content-length", "0")
+	try:
+		size = int(text)
+	except ValueError:
+		size = -1
+	if size < 0:
+		raise ServiceError("bad Content-Length: %s" % text)
+	if size > MAX_BODY:
+		raise ServiceError("request body larger than %d bytes" % MAX_BODY, 413)
+	return size
+
+
+def get_k(req):
+	k = req.get("k", 1)
+	if type(k) != int or k < 0:
+		raise ServiceError("bad k: %s" % k)
+	return k
+
+
+def get_names(req, G):
+	names = req.get("names", G.names)
+	if type(names) != list or any(type(n) != str for n in names):
+		raise ServiceError("names must be a list of non-terminals")
+	for n in names:
+		if n not in G.names:
+			raise ServiceError("unknown non-terminal %s" % n)
+	return names
+
+
+def run(port, workers = 2, timeout = 30, memory = 512 << 20):
+	"""Run the service on the given port."""
+	common.info("serving on http://localhost:%d" % port)
+	server = Service(workers, timeout, memory)
+	asyncio.run(server.serve(port))
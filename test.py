@@ -56,6 +56,512 @@ def test_follow():
 		Word('$', '$')
 	}
 
+def test_conflicts():
+	G = get_G()
+	rs = rule_lookaheads(2, "S", G)
+	assert [n for (n, X, s, l) in rs] == [1, 2]
+	assert conflicts(rs) == [(1, 2, { Word('a', 'a') })]
+	assert conflicts(rule_lookaheads(2, "R", G)) == []
+
+def test_service():
+	import service
+	G = Grammar("G2", "S -> a S b\nS -> R\nR -> b\nR -> c R")
+	(table, cs) = service.compute_analysis(1, G)
+	assert cs == []
+	r = service.parse_words(table, [["a", "c", "b", "b"], ["a"]])
+	assert [x["accepted"] for x in r] == [True, False]
+	assert r[0]["rules"] == [0, 1, 2, 4, 3]
+	import asyncio, json
+	S = service.Service(1)
+	text = "S -> a S b\nS -> R\nR -> b\nR -> c R"
+	for req in [
+		{ "grammar": text, "names": "S" },
+		{ "grammar": text, "names": [["S"]] },
+		{ "grammar": text, "names": ["X"] },
+		{ "grammar": text, "k": "1" },
+		{ "grammar": ["S -> a"] }
+	]:
+		try:
+			asyncio.run(S.process("/first", json.dumps(req)))
+			assert False
+		except service.ServiceError as e:
+			assert e.status == 400
+	async def send(request):
+		server = await asyncio.start_server(S.serve_client, "localhost", 0)
+		port = server.sockets[0].getsockname()[1]
+		async with server:
+			(reader, writer) = await asyncio.open_connection("localhost", port)
+			writer.write(request)
+			answer = await reader.read()
+			writer.close()
+			return answer
+	for (size, status) in [("x", 400), ("-1", 400), (str(1 << 30), 413)]:
+		answer = asyncio.run(send(b"POST /first HTTP/1.1\r\nContent-Length: %s\r\n\r\n{}" % size.encode()))
+		assert answer.startswith(b"HTTP/1.1 %d " % status)
+
+def test_exporters():
+	import io, json
+	G = Grammar("G2", "S -> a S b\nS -> R\nR -> b\nR -> c R")
+	T = Table(1, G, analyze(1, G))
+	out = io.StringIO()
+	T.write_to_json(out)
+	d = json.loads(out.getvalue())
+	assert len(d["entries"]) == 8
+	for (i, j, n) in d["entries"]:
+		assert T.at(d["non_terminals"][i], Word(*d["lookaheads"][j])) == n
+	out = io.StringIO()
+	T.write_to_coo(out)
+	assert "R\tb\t3\n" in out.getvalue()
+	out = io.BytesIO()
+	T.write_to_binary(out)
+	assert out.getvalue()[:9] == b"LTGT\x02\x01\x00\x00\x00"
+
+def get_G3():
+	return Grammar("G3", "S -> A x\nS -> B\nA -> a b c\nA -> a b d\nB -> c B\nB -> d")
+
+def run_parser(table, w):
+	parser = table.parse(w)
+	while not parser.is_ended():
+		parser.next()
+	return parser.action
+
+def test_adaptive():
+	G = get_G3()
+	assert analyze_adaptive(2, G) == None
+	(las, ks) = analyze_adaptive(3, G)
+	assert ks == { "S'": 1, "S": 1, "A": 3, "B": 1 }
+	T = Table(3, G, las, ks)
+	assert T.depth("S") == 1 and T.depth("A") == 3
+	assert run_parser(T, Word("a", "b", "d", "x")) == ACCEPT
+	assert run_parser(T, Word("c", "c", "d")) == ACCEPT
+	assert run_parser(T, Word("a", "b", "x")) == ERROR
+
+def test_first_follow():
+	G = get_G()
+	ff = FirstFollow(G)
+	for k in range(1, 5):
+		ff.next()
+		for X in G.names:
+			assert ff.first(X) == first(k, Word(X), G)
+			assert ff.follow(X) == follow(k, X, G)
+		for rule in G.get_rules():
+			assert ff.lookahead(rule.X, rule.w) == lookahead(k, rule.X, rule.w, G)
+	G = Grammar("dead", "S -> a A\nS -> b\nA -> A c\nB -> S d")
+	ff = FirstFollow(G)
+	ff.next()
+	ff.next()
+	assert ff.first("A") == set() and ff.first("B") == { Word("b", "d") }
+	assert ff.follow("S") == { Word("$", "$") } and ff.follow("B") == set()
+
+def test_follow_cycles():
+	G = Grammar("cycles", "S -> E\nE -> T E2\nE2 -> + T E2\nE2 -> \nT -> id\nT -> ( E )")
+	assert follow(2, "E2", G) == { Word("$", "$"), Word(")", "$"), Word(")", ")"), Word(")", "+") }
+	for G in [G, get_G3()]:
+		ff = FirstFollow(G)
+		for k in range(1, 4):
+			ff.next()
+			for X in G.names:
+				assert follow(k, X, G) == ff.follow(X)
+
+def test_sweep():
+	r = list(sweep(5, get_G3()))
+	assert [(k, las != None) for (k, las, t) in r] \
+		== [(1, False), (2, False), (3, True)]
+	T = Table(3, get_G3(), r[-1][1])
+	assert run_parser(T, Word("d")) == ACCEPT
+	r = list(sweep(5, get_G3(), 4))
+	assert [(k, las != None) for (k, las, t) in r] == [(4, True)]
+	assert run_parser(Table(4, get_G3(), r[0][1]), Word("a", "b", "d", "x")) == ACCEPT
+
+def test_linear():
+	G = get_G3()
+	for k in range(1, 5):
+		L = LinearFirstFollow(k, G)
+		for rule in G.get_rules():
+			la = L.lookahead(rule.X, rule.w)
+			assert all(w in la for w in lookahead(k, rule.X, rule.w, G))
+	assert analyze_linear(2, G) == None
+	las = analyze_linear(3, G)
+	assert all(isinstance(la, LinearSet) for (n, X, s, la) in las)
+	T = LinearTable(3, G, las)
+	assert run_parser(T, Word("a", "b", "c", "x")) == ACCEPT
+	assert run_parser(T, Word("c", "d")) == ACCEPT
+	assert run_parser(T, Word("a", "b", "x")) == ERROR
+
+def test_estimate():
+	for G in [get_G(), get_G3()]:
+		for k in range(1, 5):
+			(fb, fob) = estimate(k, G)
+			for X in G.names:
+				assert len(first(k, Word(X), G)) <= fb[X]
+				assert len(follow(k, X, G)) <= fob[X]
+
+def test_first_empty():
+	G = Grammar("empty", "S -> A b\nA -> \nA -> a")
+	assert first(1, Word("A"), G) == { EMPTY_WORD, Word("a") }
+	assert first(2, Word("S"), G) == { Word("b"), Word("a", "b") }
+
+def test_follow_nullable():
+	G = Grammar("nullable", "S -> A c\nA -> a A B\nA -> \nB -> b\nB -> ")
+	assert follow(1, "A", G) == { Word("b"), Word("c") }
+	assert follow(1, "B", G) == { Word("b"), Word("c") }
+
+def test_parse_tree():
+	G = Grammar("tree", "S -> a S b\nS -> c")
+	parser = Table(1, G, analyze(1, G)).parse(Word("a", "c", "b"))
+	tree = ParseTreeObserver()
+	tree.on_start(parser)
+	while not parser.is_ended():
+		parser.next()
+		tree.on_next(parser)
+	S = tree.get_root().children[0]
+	assert [c.sym for c in S.children] == ["a", "S", "b"]
+	assert S.children[1].rule == 2
+
+def test_transform():
+	import transform
+	G = Grammar("expr", "E -> E + T\nE -> T\nT -> T * F\nT -> F\nF -> ( E )\nF -> id")
+	T = transform.Transformation(G).remove_left_recursion().left_factor()
+	G2 = T.get_grammar()
+	las = analyze(1, G2)
+	assert las != None
+	parser = Table(1, G2, las).parse(Word("id", "+", "id", "*", "id"))
+	tree = ParseTreeObserver()
+	tree.on_start(parser)
+	while not parser.is_ended():
+		parser.next()
+		tree.on_next(parser)
+	assert parser.action == ACCEPT
+	def show(t):
+		if t.children == []:
+			return t.sym
+		return "%s%d(%s)" % (t.sym, t.rule, " ".join(show(c) for c in t.children))
+	assert show(T.restore(tree.get_root())) \
+		== "S'0(E1(E2(T4(F6(id))) + T3(T4(F6(id)) * F6(id))))"
+	assert [T.origin(n) for n in range(0, len(G2.get_rules()))] \
+		== [0, 2, 4, 5, 6, 1, None, 3, None]
+
+	# ε-rules and nullable follow cycles
+	G = Grammar("ite", "S -> if e then S\nS -> if e then S else S\nS -> x")
+	G2 = transform.left_factor(G).get_grammar()
+	assert follow(1, "S", G2) == { Word("$"), Word("else") }
+	assert transform.left_recursive(G2) == [] and transform.left_recursive(G) == []
+	G = Grammar("hidden", "S -> A S b\nS -> c\nA -> ")
+	G2 = transform.remove_left_recursion(G).get_grammar()
+	assert transform.left_recursive(G2) == ["S"]
+
+def test_lalr():
+	import lr
+	G = Grammar("expr", "E -> E + T\nE -> T\nT -> T * F\nT -> F\nF -> ( E )\nF -> id")
+	A = lr.analyze(G)
+	assert A != None
+	T = lr.Table(A)
+	assert run_parser(T, Word("(", "id", "+", "id", ")", "*", "id")) == ACCEPT
+	assert run_parser(T, Word("id", "+", "*", "id")) == ERROR
+	assert run_parser(T, Word("id", "id")) == ERROR
+
+	# LALR(1) but not SLR(1)
+	G = Grammar("lvalue", "S -> L = R\nS -> R\nL -> * R\nL -> id\nR -> L")
+	A = lr.analyze(G)
+	assert A != None
+	assert any(A.lookahead(q, 5) == { "$" } for q in range(0, len(A.states)))
+	assert run_parser(lr.Table(A), Word("*", "id", "=", "id")) == ACCEPT
+
+	# LR(1) but not LALR(1)
+	G = Grammar("merge", "S -> a A d\nS -> b B d\nS -> a B e\nS -> b A e\nA -> c\nB -> c")
+	cs = lr.Automaton(G).conflicts()
+	assert cs != [] and all(acts == [5, 6] for (q, a, acts) in cs)
+
+	# ε-rules and trees
+	G = Grammar("list", "L -> L , I\nL -> I\nI -> \nI -> x")
+	T = lr.Table(lr.analyze(G))
+	parser = T.parse(Word(",", "x"))
+	tree = lr.ParseTreeObserver()
+	tree.on_start(parser)
+	while not parser.is_ended():
+		parser.next()
+		tree.on_next(parser)
+	assert parser.action == ACCEPT
+	root = tree.get_root()
+	assert root.rule == 0 and root.children[0].rule == 1
+	assert [c.rule for c in root.children[0].children[0].children] == [3]
+
+def test_earley():
+	import earley
+	P = earley.Earley(Grammar("amb", "E -> E + E\nE -> E * E\nE -> id"))
+	F = P.parse(Word("id", "+", "id", "*", "id", "+", "id"))
+	assert F.is_accepted() and F.is_ambiguous()
+	assert F.count() == 5 and len(list(F.trees())) == 5
+	F = P.parse(Word("id", "+", "*", "id"))
+	assert not F.is_accepted() and F.error == 2
+
+	# nullable symbols and cycles
+	P = earley.Earley(Grammar("nullable", "S -> A A x\nA -> \nA -> a"))
+	trees = list(P.parse(Word("a", "x")).trees())
+	assert sorted([len(A.children) for A in t.children[0].children[:2]]
+		for t in trees) == [[0, 1], [1, 0]]
+	P = earley.Earley(Grammar("cycle", "S -> S\nS -> a"))
+	assert P.parse(Word("a")).count() == None
+
+	# same trees as the LL parser
+	G = get_G3()
+	P = earley.Earley(G)
+	las = analyze(3, G)
+	for w in [Word("a", "b", "d", "x"), Word("c", "c", "d")]:
+		parser = Table(3, G, las).parse(w)
+		tree = ParseTreeObserver()
+		tree.on_start(parser)
+		while not parser.is_ended():
+			parser.next()
+			tree.on_next(parser)
+		F = P.parse(w)
+		assert F.count() == 1 and same_tree(F.tree(), tree.get_root())
+
+def test_earley_tree():
+	import earley, io
+	P = earley.Earley(Grammar("left", "E -> E + T\nE -> T\nT -> id"))
+	w = Word("id", *(["+", "id"] * 2000))
+	t = P.parse(w).tree()
+	n = 0
+	while t.children != []:
+		assert t.sym in { "S'", "E", "T" }
+		t = t.children[0]
+		n = n + 1
+	assert n == 2003 and t.sym == "id"
+	out = io.StringIO()
+	P.parse(w[:201]).tree().write(out)
+	assert len(out.getvalue().split("\n")) == 405
+	P = earley.Earley(Grammar("cycle", "S -> S\nS -> A\nA -> S\nA -> a"))
+	t = P.parse(Word("a")).tree()
+	assert (t.children[0].rule, t.children[0].children[0].rule) == (2, 4)
+
+def test_earley_sharing():
+	import earley
+	G = Grammar("amb", "E -> E + E\nE -> a\nE -> F\nF -> a")
+	F = earley.Earley(G).parse(Word("a", "+", "a", "+", "a", "+", "a"))
+	assert F.count() == 5 * 2 ** 4
+	nodes = list(F.nodes())
+	assert len(nodes) == len({ (node.label, node.start, node.end) for node in nodes })
+
+def same_tree(t1, t2):
+	return t1.sym == t2.sym and t1.rule == t2.rule \
+		and len(t1.children) == len(t2.children) \
+		and all(same_tree(c1, c2) for (c1, c2) in zip(t1.children, t2.children))
+
+def test_lexer():
+	import lexer
+	G = Grammar("calc", "%skip \\s+\n%skip #[^\\n]*\n%token id [a-z]\\w*\n%token num \\d+\n"
+		+ "E -> T E'\nE' -> + T E'\nE' -> \nT -> ( E )\nT -> id\nT -> num\nT -> let id")
+	assert G.lexer[1] == (None, "#[^\\n]*")
+	L = lexer.for_grammar(G)
+	s = L.stream(b"let x + (lettuce + 12) # comment\n+ y")
+	assert list(s) == ["let", "id", "+", "(", "id", "+", "num", ")", "+", "id"]
+	assert s[4:].text() == "lettuce" and s[9:].location() == (2, 3)
+	T = Table(1, G, analyze(1, G))
+	assert run_parser(T, L.stream(b"a + (1 + b)")) == ACCEPT
+	parser = T.parse(L.stream(b"a +\n + 1"))
+	while not parser.is_ended():
+		parser.next()
+	assert parser.action == ERROR and parser.word.location() == (2, 2)
+	try:
+		list(L.stream(b"a ? b", "f"))
+		assert False
+	except lexer.LexerError as e:
+		assert str(e).startswith("f:1:3:")
+	L = lexer.Lexer([("ab", "(?:a|b)+"), ("c", "c+")], ["\\s+"])
+	assert list(L.stream(b"ab c ba")) == ["ab", "c", "ab"]
+	try:
+		lexer.Lexer([("aa", "(a)\\1")])
+		assert False
+	except lexer.LexerError:
+		pass
+
+def test_enumerate():
+	import earley, gen, itertools
+	G = Grammar("amb", "S -> S S\nS -> a S b\nS -> A\nA -> A\nA -> \nA -> c")
+	ws = list(gen.language(G, 4))
+	assert len(ws) == len(set(ws))
+	assert [len(w) for w in ws] == sorted(len(w) for w in ws)
+	P = earley.Earley(G)
+	assert set(ws) == { Word(*w) for n in range(0, 5)
+		for w in itertools.product("abc", repeat = n) if P.parse(Word(*w)).is_accepted() }
+	assert [str(w) for w in gen.language(G, count = 4)] == ["ε", "c", "a b", "c c"]
+	assert [str(w) for w in gen.language(get_G(), 5)] \
+		== ["a a b", "a b c a b", "a d a b b"]
+	assert gen.max_length(get_G3()) == None
+	assert gen.max_length(Grammar("finite", "S -> A A\nA -> a\nA -> ")) == 2
+
+def test_generator():
+	import earley, gen
+	G = Grammar("amb", "E -> E + E\nE -> id\nE -> ( E )\nE -> E\nF -> x")
+	R = gen.Generator(G, 7)
+	assert R.count("E", 1) > 0 and R.count("E", 2) == 0
+	P = earley.Earley(G)
+	ws = list(R.words({ 3: 1, 7: 2 }, 50))
+	assert len(ws) == 50 and all(len(w) in (3, 7) and P.parse(w).is_accepted() for w in ws)
+	assert ws == list(gen.Generator(G, 7).words({ 3: 1, 7: 2 }, 50))
+	used = set()
+	ws = list(gen.Generator(G, 1).cover(range(0, 4), used))
+	assert all(P.parse(w).is_accepted() for w in ws)
+	assert used == set(range(0, len(G.get_rules()) - 1))
+	R = gen.Generator(Grammar("catalan", "E -> E + E\nE -> id"))
+	assert [R.count("E", n) for n in range(1, 10, 2)] == [1, 1, 2, 5, 14]
+
+def test_lazy_table():
+	G = Grammar("lazy", "S -> E\nS -> U\nE -> id\nE -> ( E )\nU -> x\nU -> x y")
+	T = LazyTable(1, G)
+	assert run_parser(T, Word("(", "id", ")")) == ACCEPT
+	assert set(T.get_non_terminals()) == { "S'", "S", "E" }
+	assert T.at("E", Word("(")) == 4
+	try:
+		run_parser(T, Word("x"))
+		assert False
+	except ConflictError as e:
+		assert e.X == "U" and len(e.lines) == 3
+
+def test_batch():
+	import pytest, random, gen
+	G = Grammar("batch", "S -> E\nE -> T E2\nE2 -> + T E2\nE2 -> \nT -> id\nT -> ( E )")
+	pytest.importorskip("numpy")
+	import batch
+	ws = list(gen.Generator(G, 1).words(range(0, 30), 300))
+	R = random.Random(2)
+	ws += [Word(*R.sample(w.chars, len(w))) for w in ws] + [Word("x"), Word("id", "S")]
+	for T in [Table(1, G, analyze(1, G)), Table(2, G, analyze(2, G)),
+	Table(2, G, *analyze_adaptive(2, G))]:
+		k = T.k
+		rs = batch.BatchParser(T).parse(ws)
+		for (w, (action, i)) in zip(ws, rs):
+			P = T.parse(w)
+			while not P.is_ended():
+				P.next()
+			assert (action, i) == (P.action, len(w) + k - len(P.word))
+
+def test_ambiguity():
+	import ambiguity
+	G = Grammar("amb", "E -> E + E\nE -> id\nE -> ( E )")
+	ws = ambiguity.shortest(G, 7)
+	assert [(str(w), F.count()) for (w, F) in ws] == [("id + id + id", 2)]
+	assert ws[0][1].ambiguities() == [("E", 0, 5, [1])]
+	C = ambiguity.Counter(G)
+	for n in range(0, 6):
+		C.extend()
+	assert C.ambiguous("E", 3) == [] and C.counts["E"][3][("(", "id", ")")] == 1
+	assert C.ambiguous("E", 5) == [("id", "+", "id", "+", "id")]
+	G = Grammar("else", "S -> if c then S\nS -> if c then S else S\nS -> x")
+	assert ambiguity.shortest(G, 8) == []
+	ws = ambiguity.shortest(G, 12)
+	assert len(ws) == 1 and ws[0][1].ambiguities() == [("S", 0, 9, [1, 2])]
+	G = Grammar("cycle", "S -> A\nA -> A\nA -> a")
+	ws = ambiguity.shortest(G, 3)
+	assert [(str(w), F.count()) for (w, F) in ws] == [("a", None)]
+	assert list(ambiguity.ambiguities(get_G3(), 8)) == []
+
+def test_recover():
+	import lexer
+	G = Grammar("recover", "P -> S P\nP -> \nS -> ID = E ;\nE -> T E2\nE2 -> + T E2\nE2 -> \nT -> ID\nT -> NUM\nT -> ( E )")
+	T = Table(1, G, analyze(1, G))
+	S = sync_sets(1, G)
+	P = T.parse(Word(*"ID = + ; ID = NUM ) ; ID = NUM ;".split()), S)
+	while not P.is_ended():
+		P.next()
+	assert P.action == ERROR
+	assert [(e.pos, e.found) for e in P.errors] == [(2, Word("+")), (7, Word(")"))]
+	assert sorted(map(str, P.errors[0].expected)) == ["(", "ID", "NUM"]
+	P = T.parse(Word("ID", "=", "NUM", ";"), S)
+	while not P.is_ended():
+		P.next()
+	assert P.action == ACCEPT and P.errors == []
+	L = lexer.Lexer([("ID", "[a-z]+"), ("NUM", "[0-9]+")], [r"\s+"], ["=", ";", "+", "(", ")"])
+	P = T.parse(L.stream(b"a = 1;\nb = (2;\nc = 3 3;"), S)
+	while not P.is_ended():
+		P.next()
+	assert [(e.pos, e.text) for e in P.errors] == [(8, ";"), (12, "3")]
+	assert list(lexer.locations(P.word.source.buf, [e.offset for e in P.errors])) == [(2, 7), (3, 7)]
+
+def test_incremental():
+	G = Grammar("incremental", "P -> S P\nP -> \nS -> ID = E ;\nE -> T E2\nE2 -> + T E2\nE2 -> \nT -> ID\nT -> NUM\nT -> ( E )")
+	T = Table(1, G, analyze(1, G))
+	def check(I):
+		P = T.parse(Word(*I.chars))
+		while not P.is_ended():
+			P.next()
+		assert (I.action, I.pos) == (P.action, P.pos)
+	I = IncrementalParser(T, "ID = ( NUM + ID ) ;".split() * 2000, 64)
+	assert I.action == ACCEPT
+	assert I.edit(8003, 8004, "( ID + NUM )".split()) < 200
+	check(I)
+	assert I.edit(8003, 8008, ["+"]) < 200
+	check(I)
+	assert I.action == ERROR
+	assert I.edit(8003, 8004, ["NUM"]) < 200
+	check(I)
+	assert I.action == ACCEPT
+	assert I.edit(10, 10, "ID = NUM ; ID =".split()) < 200
+	check(I)
+	assert I.action == ERROR
+	assert I.edit(10, 16, []) < 200
+	check(I)
+	assert I.action == ACCEPT
+	assert I.edit(8003, 8004, [";"]) < 200
+	assert I.edit(12000, 12001, ["NUM"]) == 0
+	check(I)
+
+def stuck(t):
+	import signal, time
+	signal.pthread_sigmask(signal.SIG_BLOCK, { signal.SIGALRM, signal.SIGUSR1 })
+	time.sleep(t)
+
+def test_worker():
+	import os, threading, time, worker
+	pool = worker.Pool(1, timeout = 1, memory = 256 << 20)
+	def run(fun, *args):
+		ended = threading.Event()
+		job = pool.submit(fun, args, on_end = lambda job: ended.set())
+		return (job, ended)
+	def wait(fun, *args):
+		(job, ended) = run(fun, *args)
+		assert ended.wait(10)
+		return job
+	job = wait(os.getpid)
+	assert job.status == worker.DONE and job.result != os.getpid()
+	assert wait(os.getpid).result == job.result
+	job = wait(int, "x")
+	assert job.status == worker.FAILED and job.message.startswith("ValueError")
+	assert wait(time.sleep, 10).status == worker.TIMEOUT
+	assert wait(bytearray, 1 << 30).status == worker.MEMORY
+	(job, ended) = run(time.sleep, 10)
+	while job.status == worker.PENDING:
+		time.sleep(.01)
+	job.cancel()
+	assert ended.wait(10) and job.status == worker.CANCELLED
+	assert wait(sum, [1, 2, 3]).result == 6
+	pid = wait(os.getpid).result
+	assert wait(stuck, 30).status == worker.TIMEOUT
+	assert wait(os.getpid).result != pid
+	(job, ended) = run(stuck, 30)
+	while job.status == worker.PENDING:
+		time.sleep(.01)
+	job.cancel()
+	assert ended.wait(10) and job.status == worker.CANCELLED
+	assert wait(sum, [1, 2, 3]).result == 6
+
+def test_governor():
+	import lang
+	lang.GOVERNOR = Governor(words = 3)
+	try:
+		first(3, Word("S"), get_G())
+		assert False
+	except ResourceError as e:
+		assert "(R)" in str(e)
+	finally:
+		lang.GOVERNOR = None
+	rss = lang.get_rss()
+	b = b"x" * (64 << 20)
+	assert lang.get_rss() > rss + (32 << 20)
+	del b
+	assert lang.get_rss() < rss + (32 << 20)
+
 test_first()
 test_follow()
 #print("Test succeeded!")
@@ -0,0 +1,335 @@
+#
+#	Language Theory GENerator
+#	Copyright (C) 2021  Hugues Cassé <hug.casse@gmail.com>
+#
+#	This program is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	This program is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+"""Grammar transformations (left-recursion elimination, left-factoring)
+keeping the links with the original grammar.
+
+Each rule of a transformed grammar is associated with a template telling
+how to rebuild the parse tree of the source grammar from the parse tree
+of the transformed grammar. A template is one of:
+  * ("rule", n, items) -- node of source rule n whose children are
+    built from the template items,
+  * ("child", i) -- the i-th child of the current node,
+  * ("acc",) -- the tree accumulated while undoing left-recursion,
+  * ("lr", t, i) -- node built by t then extended by the chain of
+    tail rules rooted at child i (left-recursion elimination),
+  * ("tail", t, i) -- tail rule: extends the accumulated tree with t
+    and continues with child i,
+  * ("end",) -- end of a tail chain,
+  * ("split", i) -- factored prefix made of the i first children,
+    the factored rest being child i,
+  * ("join", t) -- end of factoring: t applies to the factored
+    prefixes followed by the children."""
+
+from lang import *
+
+
+def shift(t, i, n):
+	"""Shift by n the child indexes greater than i in template t."""
+	kind = t[0]
+	if kind == "child":
+		if t[1] > i:
+			return ("child", t[1] + n)
+		return t
+	elif kind == "rule":
+		return ("rule", t[1], [shift(u, i, n) for u in t[2]])
+	elif kind == "lr":
+		return ("lr", shift(t[1], i, n), t[2] + n if t[2] > i else t[2])
+	else:
+		return t
+
+
+def replace(t, i, u, n):
+	"""Replace child i of template t by template u, u spanning n children."""
+	kind = t[0]
+	if kind == "child":
+		if t[1] == i:
+			return shift(u, -1, i)
+		elif t[1] > i:
+			return ("child", t[1] + n - 1)
+		return t
+	elif kind == "rule":
+		return ("rule", t[1], [replace(v, i, u, n) for v in t[2]])
+	elif kind == "lr":
+		return ("lr", replace(t[1], i, u, n), t[2] + n - 1 if t[2] > i else t[2])
+	else:
+		return t
+
+
+def accumulate(t):
+	"""Replace child 0 by the accumulated tree in template t."""
+	return replace(t, 0, ("acc",), 0)
+
+
+def origin(t):
+	"""Get the source rule number of template t (or None)."""
+	if t[0] == "rule":
+		return t[1]
+	elif t[0] in { "lr", "tail", "join" }:
+		return origin(t[1])
+	else:
+		return None
+
+
+# Transformation class
+class Transformation:
+	"""Sequence of transformations applied to a grammar. The methods
+	performing a transformation return the transformation itself so that
+	they can be chained:
+
+		T = Transformation(G).remove_left_recursion().left_factor()
+		G2 = T.get_grammar()
+	"""
+
+	def __init__(self, G):
+		self.source = G
+		self.grammar = G
+		self.steps = []
+
+	def get_grammar(self):
+		"""Get the transformed grammar."""
+		return self.grammar
+
+	def origin(self, n):
+		"""Get the number of the rule of the source grammar that
+		corresponds to rule n of the transformed grammar. Return None
+		if rule n is an auxiliary rule."""
+		for (G, templates) in reversed(self.steps):
+			n = origin(templates[n])
+			if n == None:
+				break
+		return n
+
+	def restore(self, tree):
+		"""Rebuild the parse tree of the source grammar from a parse tree
+		of the transformed grammar."""
+		for (G, templates) in reversed(self.steps):
+			tree = Restorer(G, templates).restore(tree)
+		return tree
+
+	def fresh(self, X, used):
+		"""Build a new non-terminal name from X."""
+		while X in used:
+			X = X + "'"
+		used.add(X)
+		return X
+
+	def prepare(self):
+		"""Prepare a transformation step: return the list of
+		non-terminals (axiom first), the working rules as a map from
+		non-terminals to lists of (symbols, template) and the set of
+		used symbols."""
+		G = self.grammar
+		names = []
+		rules = {}
+		n = 0
+		for rule in G.get_rules():
+			if rule.X != G.top:
+				if rule.X not in rules:
+					names.append(rule.X)
+					rules[rule.X] = []
+				rules[rule.X].append((list(rule.w),
+					("rule", n, [("child", i) for i in range(0, len(rule.w))])))
+			n = n + 1
+		used = set(G.names) | set(G.tokens) | { G.top, "S'" }
+		return (names, rules, used)
+
+	def commit(self, rules):
+		"""Build the transformed grammar from the list of (non-terminal,
+		symbols, template)."""
+		G = Grammar([Rule(X, s) for (X, s, t) in rules])
+		self.steps.append((self.grammar, [("rule", 0, [("child", 0)])]
+			+ [t for (X, s, t) in rules]))
+		self.grammar = G
+		return self
+
+	def remove_left_recursion(self):
+		"""Remove the direct and indirect left recursion (Paull's
+		algorithm). Non-terminals are only substituted inside the
+		strongly connected components of the left-corner relation and
+		rules X -> X are removed. Left recursion hidden behind nullable
+		symbols is not handled: left_recursive() detects it."""
+		(names, rules, used) = self.prepare()
+
+		# compute left-recursive components
+		corner = { X: { s[0] for (s, t) in rules[X] if s != [] and s[0] in rules }
+			for X in names }
+		reach = { X: set(corner[X]) for X in names }
+		changed = True
+		while changed:
+			changed = False
+			for X in names:
+				for Y in list(reach[X]):
+					if not reach[Y] <= reach[X]:
+						reach[X] |= reach[Y]
+						changed = True
+
+		# Paull's algorithm
+		result = []
+		for i in range(0, len(names)):
+			A = names[i]
+			for j in range(0, i):
+				B = names[j]
+				if A not in reach[B] or B not in reach[A]:
+					continue
+				rs = []
+				for (s, t) in rules[A]:
+					if s == [] or s[0] != B:
+						rs.append((s, t))
+					else:
+						for (d, u) in rules[B]:
+							rs.append((d + s[1:], replace(t, 0, u, len(d))))
+				rules[A] = rs
+
+			# remove direct left recursion
+			rec = [(s[1:], t) for (s, t) in rules[A] if s != [] and s[0] == A]
+			if rec == []:
+				continue
+			base = [(s, t) for (s, t) in rules[A] if s == [] or s[0] != A]
+			A2 = self.fresh(A + "'", used)
+			rules[A] = [(s + [A2], ("lr", t, len(s))) for (s, t) in base]
+			rules[A2] = [(s + [A2], ("tail", accumulate(t), len(s)))
+				for (s, t) in rec if s != []] + [([], ("end",))]
+			result.append(A2)
+
+		return self.commit([(X, s, t) for X in names + result
+			for (s, t) in rules[X]])
+
+	def left_factor(self):
+		"""Factor the common prefixes of the rules of each
+		non-terminal."""
+		(names, rules, used) = self.prepare()
+		result = []
+		todo = [(X, rules[X], False) for X in names]
+		while todo != []:
+			(X, rs, aux) = todo.pop(0)
+			groups = {}
+			for (s, t) in rs:
+				groups.setdefault(s[0] if s != [] else None, []).append((s, t))
+			for (a, g) in groups.items():
+				if len(g) == 1 or a == None:
+					for (s, t) in g:
+						if aux:
+							t = ("join", t)
+						result.append((X, s, t))
+				else:
+					p = 1
+					while all(len(s) > p and s[p] == g[0][0][p] for (s, t) in g):
+						p = p + 1
+					X2 = self.fresh(X + "'", used)
+					result.append((X, g[0][0][:p] + [X2], ("split", p)))
+					todo.append((X2, [(s[p:], t) for (s, t) in g], True))
+		return self.commit(result)
+
+
+# Restorer class
+class Restorer:
+	"""Rebuilds a parse tree of grammar G from a parse tree of a grammar
+	transformed from G with the given templates."""
+
+	def __init__(self, G, templates):
+		self.G = G
+		self.templates = templates
+
+	def restore(self, node):
+		if node.rule == None:
+			copy = ParseTree(node.sym)
+			for child in node.children:
+				copy.append_child(self.restore(child))
+			return copy
+		else:
+			return self.build(self.templates[node.rule], node.children)[0]
+
+	def build(self, t, children, acc = None):
+		"""Build the list of nodes of G corresponding to template t
+		applied to the given children."""
+		kind = t[0]
+		if kind == "child":
+			return [self.restore(children[t[1]])]
+		elif kind == "acc":
+			return [acc]
+		elif kind == "rule":
+			node = ParseTree(self.G.get_rules()[t[1]].X)
+			node.rule = t[1]
+			for u in t[2]:
+				for child in self.build(u, children, acc):
+					node.append_child(child)
+			return [node]
+		elif kind == "lr":
+			node = self.build(t[1], children, acc)[0]
+			tail = children[t[2]]
+			while tail.rule != None:
+				u = self.templates[tail.rule]
+				if u[0] != "tail":
+					break
+				node = self.build(u[1], tail.children, node)[0]
+				tail = tail.children[u[2]]
+			return [node]
+		elif kind == "split":
+			prefix = children[:t[1]]
+			node = children[t[1]]
+			while node.rule != None and self.templates[node.rule][0] == "split":
+				i = self.templates[node.rule][1]
+				prefix = prefix + node.children[:i]
+				node = node.children[i]
+			if node.rule == None:
+				return [self.restore(n) for n in prefix + [node]]
+			return self.build(self.templates[node.rule][1],
+				prefix + node.children, acc)
+		else:
+			return []
+
+
+def left_recursive(G):
+	"""Get the sorted list of the left-recursive non-terminals of G,
+	including the left recursion hidden behind nullable symbols."""
+	nullable = set()
+	changed = True
+	while changed:
+		changed = False
+		for rule in G.get_rules():
+			if rule.X not in nullable and all(a in nullable for a in rule.w):
+				nullable.add(rule.X)
+				changed = True
+	corner = { X: set() for X in G.names }
+	for rule in G.get_rules():
+		for a in rule.w:
+			if a in corner:
+				corner[rule.X].add(a)
+			if a not in nullable:
+				break
+	reach = { X: set(corner[X]) for X in G.names }
+	changed = True
+	while changed:
+		changed = False
+		for X in G.names:
+			for Y in list(reach[X]):
+				if not reach[Y] <= reach[X]:
+					reach[X] |= reach[Y]
+					changed = True
+	return sorted(X for X in G.names if X in reach[X])
+
+
+def remove_left_recursion(G):
+	"""Remove the left recursion of G and return the transformation."""
+	return Transformation(G).remove_left_recursion()
+
+
+def left_factor(G):
+	"""Left-factor G and return the transformation."""
+	return Transformation(G).left_factor()
@@ -23,7 +23,27 @@ from orchid import *
 import common
 import lang
 import ll
+import worker
 from functools import partial
+import queue
+
+# shared pool of workers
+POOL = None
+
+# maximal number of words in a first/follow set and warning threshold
+MAX_WORDS = 1000000
+WARN_WORDS = 10000
+
+# period (in ms) of polling of the job messages by the UI
+POLL_PERIOD = 100
+
+# messages for job ends
+END_MESSAGES = {
+	worker.CANCELLED: "Cancelled.",
+	worker.TIMEOUT: "Stopped: time budget exhausted.",
+	worker.MEMORY: "Stopped: memory budget exhausted.",
+	worker.FAILED: "Stopped."
+}
 
 # FatalException class
 class FatalException(BaseException):
@@ -69,19 +89,23 @@ class MyPage(LTPage):
 		common.STDOUT = self
 		common.STDERR = self
 		common.EXIT = self.exit
+		self.cache = common.LRUCache(32)
+		self.job = None
+		self.messages = queue.Queue()
 		llk = Button("LL(k)",
-			on_click = partial(self.get_grammar, self.do_ll_check))
+			on_click = partial(self.get_grammar, do_ll_check))
 		first = Button("first(k)",
-			on_click = partial(self.get_grammar, self.do_first))
+			on_click = partial(self.get_grammar, do_first))
 		follow = Button("follow(k)",
-			on_click = partial(self.get_grammar, self.do_follow))
+			on_click = partial(self.get_grammar, do_follow))
 		lookahead = Button("lookahead(k)",
-			on_click = partial(self.get_grammar, self.do_lookahead))
+			on_click = partial(self.get_grammar, do_lookahead))
+		cancel = Button("Cancel", on_click = self.cancel)
 		self.grammar = Editor()
 		self.console = Console(init = "Welcome to LTGen!\n\n")
 		self.k = Field("k =", 1, 3, is_valid = is_valid_number)
 		parse = Button("Parse",
-			on_click = partial(self.get_grammar, self.do_parse))
+			on_click = partial(self.get_grammar, do_parse))
 		self.word = Field(size=16)
 		LTPage.__init__(self,
 			VGroup([
@@ -96,6 +120,7 @@ class MyPage(LTPage):
 					follow,
 					lookahead,
 					self.k,
+					cancel,
 					Spring(hexpand = True),
 					self.word,
 					parse
@@ -116,6 +141,7 @@ class MyPage(LTPage):
 			self.console
 		)
 		EnableIf(IsValid(self.k), llk, first, follow, lookahead)
+		self.timer = Timer(self, self.poll, period = POLL_PERIOD)
 
 	def get_grammar(self, f):
 		self.grammar.get_content(partial(self.parse, f))
@@ -124,40 +150,136 @@ class MyPage(LTPage):
 		try:
 			G = lang.Grammar("G", content)
 			k = int(self.k.get_content())
-			print("DEBUG: k=", k)
-			f(G, k)
+			args = (G, k)
+			if f == do_parse:
+				args = (G, k, lang.Word(*self.word.get_content().split()))
+			self.launch(f, args, common.digest(content, k, f.__name__, *args[2:]))
 		except FatalException:
 			self.console.append("Stopped")
 
-	def do_parse(self, G, k):
-		pass
-
-	def do_first(self, G, k):
-		for n in G.names:
-			f = lang.first(k, (n, ), G)
-			self.console.append("first%d(%s) = %s" % (k, n, lang.word_set_to_str(f)))
-		self.console.append("")
-
-	def do_follow(self, G, k):
-		for n in G.names:
-			f = lang.follow(k, n, G)
-			self.console.append("follow%d(%s) = %s" % (k, n, lang.word_set_to_str(f)))
-		self.console.append("")
-
-	def do_lookahead(self, G, k):
-		for (X, s) in G.get_rules():
-			f = ll.lookahead(k, X, s, G)
-			self.console.append("%d-lookahead(%s -> %s) = %s" % \
-				(k, X, lang.word_to_str(s), lang.word_set_to_str(f)))
-		self.console.append("")
-
-	def do_ll_check(self, G, k):
-		las = ll.analyze(k, G)
-		if las == None:
-			common.fatal("G is not LL(%d)!" % k)
+	def launch(self, f, args, key):
+		"""Launch the analysis f(*args) in the worker pool and display its
+		results as soon as they are produced. If the result is already
+		in the cache, just display it. As the callbacks of the job are
+		called from a thread of the pool, they only post messages
+		displayed by poll() in the UI thread."""
+		lines = self.cache.get(key)
+		if lines != None:
+			for l in lines:
+				self.console.append(l)
+			self.console.append("")
+		elif self.job != None and not self.job.is_ended():
+			self.console.append("An analysis is already running: cancel it first.")
+		else:
+			lines = []
+			def on_output(line):
+				self.messages.put((lines, line, line))
+			def on_item(item):
+				(i, n, line) = item
+				self.messages.put((lines, line, "[%d/%d] %s" % (i, n, line)))
+			def on_end(job):
+				self.messages.put((lines, None, (key, job)))
+			self.job = POOL.submit(f, args, on_output, on_end, on_item)
+			self.timer.start()
+
+	def poll(self):
+		"""Display, in the UI thread, the messages posted by the running
+		job."""
+		while True:
+			try:
+				(lines, line, msg) = self.messages.get_nowait()
+			except queue.Empty:
+				return
+			if line != None:
+				lines.append(line)
+				self.console.append(msg)
+				continue
+			(key, job) = msg
+			if job is self.job:
+				self.timer.stop()
+			if job.status == worker.DONE:
+				self.cache.put(key, lines)
+			else:
+				if job.message != None:
+					self.console.append("ERROR: %s" % job.message)
+				self.console.append(END_MESSAGES[job.status])
+			self.console.append("")
+
+	def cancel(self):
+		if self.job != None:
+			self.job.cancel()
+
+
+# analyses (run in the worker processes)
+# Each analysis is a generator producing (number of done items,
+# total number of items, result line) as soon as a line is computed.
+
+def govern():
+	lang.GOVERNOR = lang.Governor(words = MAX_WORDS)
+
+def warn(k, G, n):
+	(fb, fob) = lang.estimate(k, G)
+	for X in G.names:
+		if fb[X] > WARN_WORDS:
+			yield (0, n, "WARNING: first%d(%s) may contain up to %d words." % (k, X, fb[X]))
+		if fob[X] > WARN_WORDS:
+			yield (0, n, "WARNING: follow%d(%s) may contain up to %d words." % (k, X, fob[X]))
+
+def do_first(G, k):
+	yield from warn(k, G, len(G.names))
+	for (i, n) in enumerate(G.names):
+		f = lang.first(k, lang.Word(n), G)
+		yield (i + 1, len(G.names),
+			"first%d(%s) = %s" % (k, n, lang.word_set_to_str(f)))
+
+def do_follow(G, k):
+	yield from warn(k, G, len(G.names))
+	for (i, n) in enumerate(G.names):
+		f = lang.follow(k, n, G)
+		yield (i + 1, len(G.names),
+			"follow%d(%s) = %s" % (k, n, lang.word_set_to_str(f)))
+
+def do_lookahead(G, k):
+	rules = G.get_rules()
+	yield from warn(k, G, len(rules))
+	for (i, rule) in enumerate(rules):
+		f = ll.lookahead(k, rule.X, rule.w, G)
+		yield (i + 1, len(rules),
+			"%d-lookahead(%s) = %s" % (k, rule, lang.word_set_to_str(f)))
+
+def do_ll_check(G, k):
+	yield from warn(k, G, len(G.names))
+	success = True
+	for (i, X) in enumerate(G.names):
+		rs = ll.rule_lookaheads(k, X, G)
+		cs = ll.conflicts(rs)
+		if cs == []:
+			yield (i + 1, len(G.names), "%s is LL(%d)." % (X, k))
 		else:
-			common.info("G is LL(%d)." % k)
-		self.console.append("")
+			success = False
+			for l in ll.conflicts_to_str(k, rs, cs):
+				yield (i + 1, len(G.names), l)
+	if success:
+		yield (len(G.names), len(G.names), "G is LL(%d)." % k)
+	else:
+		yield (len(G.names), len(G.names), "G is not LL(%d)!" % k)
+
+def do_parse(G, k, w):
+	las = ll.analyze(k, G)
+	if las == None:
+		yield (0, len(w), "G is not LL(%d)!" % k)
+		return
+	parser = ll.Table(k, G, las).parse(w)
+	display = ll.DisplayObserver()
+	while not parser.is_ended():
+		(stack, word) = (parser.stack, parser.word)
+		parser.next()
+		yield (parser.pos, len(w), "%s | %s | %s"
+			% (stack, word, display.message(parser.action)))
+	if parser.action == ll.ACCEPT:
+		yield (len(w), len(w), "%s accepted." % w)
+	else:
+		yield (parser.pos, len(w), "syntax error at token %d." % parser.pos)
 
 
 class LTApplication(Application):
@@ -174,5 +296,9 @@ class LTApplication(Application):
 		return MyPage()
 	
 
-def run(port):
+def run(port, workers = 2, timeout = 30, memory = 512 << 20):
+	"""Run the UI server. Analyses are performed by at most workers
+	processes, each one limited to timeout seconds and memory bytes."""
+	global POOL
+	POOL = worker.Pool(workers, timeout, memory, govern)
 	orchid.run(LTApplication(), port = port, dirs = ["./assets"])
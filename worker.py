@@ -0,0 +1,498 @@
+#
+#	Language Theory GENerator
+#	Copyright (C) 2021  Hugues Cassé <hug.casse@gmail.com>
+#
+#	This program is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	This program is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+"""Pool of worker processes running computations outside of the caller
+process, with time and memory budgets and cancellation.
+
+The worker processes are kept from a job to the next one. They are
+forked by a launcher process, itself forked when the pool is created:
+as the launcher never runs threads, the workers are not forked from a
+multi-threaded process (the pool has to be created before the caller
+starts its own threads). The workers can not be spawned as ltgen.py is
+a script that can not be imported again.
+
+A worker enforces the budgets of its job: a timer signal stops a job
+out of time, the address space of the process is limited while a job
+runs and a cancelled job is stopped by a signal. As a job blocked in a
+long native call does not see the signals, the pool also watches the
+running jobs and kills the workers whose job is not ended GRACE seconds
+after its time budget or its cancellation. A worker is replaced after
+MAX_TASKS jobs, after a job exhausting its memory or when it is killed.
+Each worker sends the outputs, the items and the end of its jobs on its
+own connection, read by a thread of the pool."""
+
+import collections
+import inspect
+import itertools
+import multiprocessing
+import multiprocessing.connection
+import os
+import pickle
+import resource
+import signal
+import socket
+import struct
+import threading
+import time
+
+import common
+
+# job states
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMEOUT = "timeout"
+MEMORY = "memory"
+
+# number of jobs run by the worker processes before being replaced
+MAX_TASKS = 64
+
+# number of cancelled jobs remembered by the workers
+CANCEL_SLOTS = 64
+
+# delay (in seconds) before killing a worker whose job is out of time
+# or cancelled
+GRACE = 1.0
+
+# period (in seconds) of the watch of the running jobs
+WATCH_PERIOD = 0.1
+
+# signals stopping a job
+SIGNALS = { signal.SIGALRM, signal.SIGUSR1 }
+
+
+class ExitException(Exception):
+	"""Raised in the worker process in place of exit."""
+	pass
+
+
+class StopException(BaseException):
+	"""Raised in the worker process to stop the running job with the
+	given status (TIMEOUT or CANCELLED)."""
+
+	def __init__(self, status):
+		BaseException.__init__(self, status)
+		self.status = status
+
+
+# worker process state: connection to the pool, identifiers of the
+# cancelled jobs and identifier of the running job
+CONN = None
+CANCELS = None
+JOB = None
+
+
+def send(msg):
+	"""Send a message to the pool (the stopping signals are delayed
+	until the message is completely sent)."""
+	signal.pthread_sigmask(signal.SIG_BLOCK, SIGNALS)
+	try:
+		CONN.send(msg)
+	finally:
+		signal.pthread_sigmask(signal.SIG_UNBLOCK, SIGNALS)
+
+
+class ConnOutput:
+	"""Output stream sending each written line to the pool."""
+
+	def write(self, msg):
+		if msg.endswith("\n"):
+			msg = msg[:-1]
+		send((JOB, "out", msg))
+
+
+def exit(n):
+	raise ExitException(n)
+
+
+def get_used_memory():
+	"""Get the size of the address space of the current process."""
+	try:
+		with open("/proc/self/statm") as f:
+			return int(f.read().split()[0]) * resource.getpagesize()
+	except (OSError, ValueError):
+		return 0
+
+
+def set_memory_limit(size):
+	"""Limit the memory of the current process to size bytes more than
+	the memory already in use (no limit if size is None)."""
+	(soft, hard) = resource.getrlimit(resource.RLIMIT_AS)
+	if size == None:
+		limit = hard
+	else:
+		limit = get_used_memory() + size
+		if hard != resource.RLIM_INFINITY:
+			limit = min(limit, hard)
+	try:
+		resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+	except (ValueError, OSError):
+		pass
+
+
+def is_cancelled(id):
+	return id in CANCELS[:]
+
+
+def on_timeout(sig, frame):
+	if JOB != None:
+		raise StopException(TIMEOUT)
+
+
+def on_cancel(sig, frame):
+	if JOB != None and is_cancelled(JOB):
+		raise StopException(CANCELLED)
+
+
+def serve(conn, cancels, init):
+	"""Main loop of a worker process: run the jobs received on conn
+	until MAX_TASKS jobs are done, a job exhausts the memory or the
+	pool is closed."""
+	global CONN, CANCELS
+	CONN = conn
+	CANCELS = cancels
+	common.STDOUT = ConnOutput()
+	common.STDERR = common.STDOUT
+	common.EXIT = exit
+	signal.signal(signal.SIGALRM, on_timeout)
+	signal.signal(signal.SIGUSR1, on_cancel)
+	if init != None:
+		init()
+	for i in range(0, MAX_TASKS):
+		try:
+			(id, data, timeout, memory) = conn.recv()
+		except (EOFError, OSError):
+			break
+		if run_job(id, data, timeout, memory) == MEMORY:
+			break
+
+
+def run_job(id, data, timeout, memory):
+	"""Run a job in the worker process: data is the pickled (function,
+	arguments) and the end of the job is sent as (status, value) with
+	value the result or an error message. Return the status."""
+	global JOB
+	JOB = id
+	send((id, "start", os.getpid()))
+	try:
+		try:
+			if is_cancelled(id):
+				raise StopException(CANCELLED)
+			(fun, args) = pickle.loads(data)
+			set_memory_limit(memory)
+			if timeout != None:
+				signal.setitimer(signal.ITIMER_REAL, timeout)
+			r = fun(*args)
+			if inspect.isgenerator(r):
+				for x in r:
+					send((id, "item", x))
+				r = None
+			end = (DONE, r)
+		finally:
+			JOB = None
+			signal.setitimer(signal.ITIMER_REAL, 0)
+			set_memory_limit(None)
+	except StopException as e:
+		end = (e.status, None)
+	except ExitException:
+		end = (FAILED, None)
+	except MemoryError:
+		end = (MEMORY, None)
+	except Exception as e:
+		end = (FAILED, "%s: %s" % (type(e).__name__, e))
+	try:
+		send((id, "end", end))
+	except Exception as e:
+		end = (FAILED, "%s: %s" % (type(e).__name__, e))
+		send((id, "end", end))
+	return end[0]
+
+
+def launch(sock, other, cancels, init):
+	"""Main loop of the launcher process: fork a worker process for
+	each connection received on sock and answer its PID."""
+	other.close()
+	signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+	while True:
+		try:
+			(msg, fds, flags, addr) = socket.recv_fds(sock, 16, 1)
+		except OSError:
+			break
+		if msg == b"" or fds == []:
+			break
+		pid = os.fork()
+		if pid == 0:
+			sock.close()
+			signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+			try:
+				serve(multiprocessing.connection.Connection(fds[0]),
+					cancels, init)
+			finally:
+				os._exit(0)
+		os.close(fds[0])
+		sock.send(struct.pack("q", pid))
+
+
+# Worker class
+class Worker:
+	"""Worker process as seen by the pool."""
+
+	def __init__(self, pid, conn):
+		self.pid = pid
+		self.conn = conn
+		self.job = None
+		self.tasks = 0
+
+
+# Job class
+class Job:
+	"""A computation submitted to a pool. on_output(line) is called for
+	each line output by the computation and on_end(job) once the job
+	is ended: status tells then how it ended, result contains the
+	value returned by the computation and message a possible error
+	message. If the computation is a generator, on_item(x) is called
+	as soon as an item x is generated. Notice that the callbacks are
+	called from a thread of the pool."""
+
+	def __init__(self, pool, id, fun, args, on_output, on_end, on_item = None):
+		self.pool = pool
+		self.id = id
+		self.fun = fun
+		self.args = args
+		self.on_output = on_output
+		self.on_end = on_end
+		self.on_item = on_item
+		self.status = PENDING
+		self.result = None
+		self.message = None
+		self.pid = None
+		self.cancelled = False
+		self.worker = None
+		self.deadline = None
+
+	def is_ended(self):
+		return self.status not in { PENDING, RUNNING }
+
+	def cancel(self):
+		"""Stop the job as soon as possible."""
+		self.pool.cancel(self)
+
+
+# Pool class
+class Pool:
+	"""Pool running at most size jobs at the same time in worker
+	processes. A job is stopped after timeout seconds and its memory
+	is limited to memory bytes (None for no limit). If given, init is
+	called in each worker process before running its first job."""
+
+	def __init__(self, size = 2, timeout = 30, memory = 512 << 20,
+	init = None):
+		self.size = size
+		self.timeout = timeout
+		self.memory = memory
+		self.context = multiprocessing.get_context("fork")
+		self.cancels = self.context.Array("q", [-1] * CANCEL_SLOTS)
+		self.ids = itertools.count()
+		self.jobs = {}
+		self.pending = collections.deque()
+		self.workers = []
+		self.lock = threading.Lock()
+		(self.sock, other) = socket.socketpair(socket.AF_UNIX,
+			socket.SOCK_SEQPACKET)
+		self.launcher = self.context.Process(target = launch,
+			args = (other, self.sock, self.cancels, init), daemon = True)
+		self.launcher.start()
+		other.close()
+		threading.Thread(target = self.dispatch, daemon = True).start()
+
+	def start_worker(self):
+		"""Fork a new worker by the launcher (called with the lock)."""
+		(conn, other) = socket.socketpair()
+		try:
+			socket.send_fds(self.sock, [b"w"], [other.fileno()])
+		finally:
+			other.close()
+		(pid, ) = struct.unpack("q", self.sock.recv(8))
+		w = Worker(pid, multiprocessing.connection.Connection(conn.detach()))
+		self.workers.append(w)
+		return w
+
+	def drop_worker(self, w, sig = None):
+		"""Remove the worker from the pool, killing it if sig is given
+		(called with the lock)."""
+		if w in self.workers:
+			self.workers.remove(w)
+			if sig != None:
+				self.kill(w.pid, sig)
+			w.conn.close()
+
+	def schedule(self, ends):
+		"""Send the pending jobs to idle workers, starting new workers
+		if needed (called with the lock). The jobs that can not be sent
+		are added to ends."""
+		while len(self.pending) != 0:
+			w = None
+			for v in self.workers:
+				if v.job == None:
+					w = v
+					break
+			if w == None:
+				if len(self.workers) >= self.size:
+					return
+				w = self.start_worker()
+			job = self.pending.popleft()
+			try:
+				data = pickle.dumps((job.fun, job.args))
+			except Exception as e:
+				ends.append((job, FAILED, "%s: %s" % (type(e).__name__, e)))
+				continue
+			try:
+				w.conn.send((job.id, data, self.timeout, self.memory))
+			except OSError:
+				self.drop_worker(w)
+				self.pending.appendleft(job)
+				continue
+			w.job = job
+			job.worker = w
+			if self.timeout != None:
+				job.deadline = time.monotonic() + self.timeout + GRACE
+
+	def submit(self, fun, args = (), on_output = None, on_end = None,
+	on_item = None):
+		"""Run fun(*args) in a worker process and return the
+		corresponding job."""
+		ends = []
+		with self.lock:
+			job = Job(self, next(self.ids), fun, args, on_output, on_end, on_item)
+			self.jobs[job.id] = job
+			self.pending.append(job)
+			self.schedule(ends)
+		self.end_all(ends)
+		return job
+
+	def cancel(self, job):
+		"""Stop the given job."""
+		with self.lock:
+			if job.is_ended() or job.cancelled:
+				return
+			job.cancelled = True
+			if job in self.pending:
+				self.pending.remove(job)
+				pending = True
+			else:
+				pending = False
+				self.cancels[job.id % CANCEL_SLOTS] = job.id
+				job.deadline = time.monotonic() + GRACE
+				self.kill(job.worker.pid, signal.SIGUSR1)
+		if pending:
+			self.end(job, CANCELLED)
+
+	def kill(self, pid, sig):
+		try:
+			os.kill(pid, sig)
+		except OSError:
+			pass
+
+	def end(self, job, status, message = None, result = None):
+		"""End the job (only once)."""
+		with self.lock:
+			if self.jobs.pop(job.id, None) == None:
+				return
+			job.status = status
+			job.message = message
+			job.result = result
+		if job.on_end != None:
+			job.on_end(job)
+
+	def end_all(self, ends):
+		for (job, status, message) in ends:
+			self.end(job, status, message)
+
+	def watch(self):
+		"""Kill the workers whose job is out of time or cancelled for
+		more than GRACE seconds."""
+		now = time.monotonic()
+		ends = []
+		with self.lock:
+			for w in list(self.workers):
+				job = w.job
+				if job != None and job.deadline != None and now > job.deadline:
+					self.drop_worker(w, signal.SIGKILL)
+					ends.append((job, CANCELLED if job.cancelled else TIMEOUT, None))
+			self.schedule(ends)
+		self.end_all(ends)
+
+	def receive(self, w):
+		"""Receive and dispatch a message of worker w."""
+		ends = []
+		try:
+			(id, kind, value) = w.conn.recv()
+		except (EOFError, OSError):
+			with self.lock:
+				self.drop_worker(w)
+				if w.job != None:
+					ends.append((w.job, FAILED, "worker process died"))
+				self.schedule(ends)
+			self.end_all(ends)
+			return
+		job = self.jobs.get(id)
+		if kind == "end":
+			(status, value) = value
+			with self.lock:
+				w.job = None
+				w.tasks = w.tasks + 1
+				if status == MEMORY or w.tasks >= MAX_TASKS:
+					self.drop_worker(w)
+				self.schedule(ends)
+			if job != None and status == DONE:
+				self.end(job, DONE, result = value)
+			elif job != None:
+				self.end(job, status, value)
+			self.end_all(ends)
+		elif job == None:
+			return
+		elif kind == "start":
+			job.pid = value
+			job.status = RUNNING
+		elif kind == "out":
+			if job.on_output != None:
+				job.on_output(value)
+		elif kind == "item":
+			if job.on_item != None:
+				job.on_item(value)
+
+	def dispatch(self):
+		"""Thread dispatching the messages of the workers to the jobs
+		and watching the running jobs."""
+		while True:
+			with self.lock:
+				workers = { w.conn: w for w in self.workers }
+			if workers == {}:
+				time.sleep(WATCH_PERIOD)
+			else:
+				try:
+					ready = multiprocessing.connection.wait(list(workers),
+						WATCH_PERIOD)
+				except (OSError, ValueError):
+					ready = []
+				for conn in ready:
+					if not conn.closed:
+						self.receive(workers[conn])
+			self.watch()